@@ -12,6 +12,7 @@ function make-cidata-iso() {
     local keysfile="$1"; shift
     local usertmpl="$1"; shift
     local imagename="$1"; shift
+    local profile="$1"; shift
 
     local MNT=$(mktemp -d /mnt/cidata-mnt-XXX)
     cat > $MNT/meta-data << EOF
@@ -19,9 +20,16 @@ instance-id: iid-local01
 local-hostname: cloudimg
 EOF
 
-    jinja2 -D stem=$stem $usertmpl $keysfile > $MNT/user-data
-    # it's important that the volume be named cidata
-    genisoimage -output $imagename -volid cidata -joliet -rock $MNT/user-data $MNT/meta-data >& /dev/null
+    jinja2 -D stem=$stem -D profile=$profile $usertmpl $keysfile > $MNT/user-data
+    # keep the seed untouched if its contents have not changed
+    # so that it does not need to be re-inserted in the virtual media slot
+    if [[ -f $imagename ]] && cmp -s $MNT/user-data $imagename.user-data; then
+        echo "$imagename is up to date"
+    else
+        # it's important that the volume be named cidata
+        genisoimage -output $imagename -volid cidata -joliet -rock $MNT/user-data $MNT/meta-data >& /dev/null
+        cp $MNT/user-data $imagename.user-data
+    fi
 
     if [[ -z "$DEBUG" ]]; then
         rm -rf $MNT
@@ -31,21 +39,26 @@ EOF
     # echo Done in $imagename
 }
 
-USAGE="Usage: $COMMAND stem keysfile user-data-template path-to-seed"
+USAGE="Usage: $COMMAND stem keysfile user-data-template [path-to-seed [profile]]"
 
 function main() {
 
-    [[ "$#" =~ ^[34]$ ]] || { echo $USAGE; exit 1;}
+    [[ "$#" =~ ^[345]$ ]] || { echo $USAGE; exit 1;}
 
     # pass e.g. w1
     local stem="$1"; shift
     local keysfile="$1"; shift
     local usertmpl="$1"; shift
-    local imagename="$1"; shift
+    # these 2 are optional
+    local imagename="$1"; shift || :
+    # full, fast or minimal - see the template
+    local profile="$1"; shift || :
 
     [[ -z $imagename ]] && imagename="/srv/shares/bootable-images/cidata-seed-${stem}.iso"
 
-    make-cidata-iso $stem $keysfile $usertmpl $imagename
+    [[ -z $profile ]] && profile="full"
+
+    make-cidata-iso $stem $keysfile $usertmpl $imagename $profile
 }
 
 main "$@"
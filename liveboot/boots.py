@@ -0,0 +1,111 @@
+# pylint: disable=missing-function-docstring
+
+"""
+a log of the liveboots, to measure the time it takes for a node to become
+ssh-reachable, depending on the image and on the cloud-init seed profile
+
+* liveboot records each boot, with its image and profile, once the node
+  has been powered on
+* wait then records when the node has become ssh-reachable
+"""
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from .scheduler import connect_shared
+
+
+DEFAULT_DIRECTORY = "/var/lib/sopnode/liveboot"
+
+# a wait that ends later than that after the boot is not related to it
+MAX_TIME_TO_SSH = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS boots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stem TEXT NOT NULL,
+    image TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    booted REAL NOT NULL,
+    ssh_ready REAL
+)
+"""
+
+
+@dataclass
+class BootLog:
+    directory: str = DEFAULT_DIRECTORY
+
+    def __repr__(self):
+        return f"BootLog {self.directory}"
+
+    @staticmethod
+    def from_config(config) -> "BootLog":
+        """
+        uses the same directory as the scheduler
+        """
+        return BootLog(
+            directory=config.get('scheduler', {}).get('directory', DEFAULT_DIRECTORY))
+
+
+    @contextmanager
+    def _database(self):
+        connection = connect_shared(self.directory, "boots.sqlite", timeout=30)
+        try:
+            connection.execute(SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+    def record_boot(self, stem, image, profile) -> None:
+        with self._database() as db:
+            db.execute(
+                "INSERT INTO boots (stem, image, profile, booted) VALUES (?, ?, ?, ?)",
+                (stem, image, profile, time.time()))
+
+    def record_ssh_ready(self, stem) -> tuple:
+        """
+        mark the last boot of that node as ssh-ready
+
+        returns a (image, profile, time_to_ssh) tuple,
+        or None if there is no recent boot pending
+        """
+        now = time.time()
+        with self._database() as db:
+            row = db.execute(
+                "SELECT id, image, profile, booted FROM boots"
+                " WHERE stem = ? AND ssh_ready IS NULL AND booted > ?"
+                " ORDER BY booted DESC LIMIT 1",
+                (stem, now - MAX_TIME_TO_SSH)).fetchone()
+            if row is None:
+                return None
+            boot_id, image, profile, booted = row
+            db.execute(
+                "UPDATE boots SET ssh_ready = ? WHERE id = ?", (now, boot_id))
+            return image, profile, now - booted
+
+
+    def get_stats(self) -> list[tuple]:
+        """
+        returns a list of (image, profile, count, average, min, max) tuples
+        about the time to ssh
+        """
+        with self._database() as db:
+            return db.execute(
+                "SELECT image, profile, COUNT(*), AVG(ssh_ready - booted),"
+                " MIN(ssh_ready - booted), MAX(ssh_ready - booted)"
+                " FROM boots WHERE ssh_ready IS NOT NULL"
+                " GROUP BY image, profile ORDER BY image, profile").fetchall()
+
+    def show_stats(self) -> None:
+        stats = self.get_stats()
+        if not stats:
+            print("no boot recorded")
+            return
+        margin = max(len(image) for image, *_ in stats)
+        for image, profile, count, average, mini, maxi in stats:
+            print(f"{image:>{margin}} {profile:>8}: time to ssh {average:5.0f}s on average"
+                  f" (min {mini:.0f}s, max {maxi:.0f}s, {count} boots)")
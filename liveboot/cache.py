@@ -0,0 +1,124 @@
+# pylint: disable=missing-function-docstring
+# pylint: disable=logging-fstring-interpolation
+
+"""
+a local cache for the state of the nodes, as seen from their iDRAC
+
+this is about the things that change rarely, and that are slow to probe:
+
+* 'power': the power state
+* 'bios': the BIOS attributes
+* 'media': the virtual media slots
+
+each node has its own JSON file, where each field comes with the
+time it was fetched; the Idrac class writes in the cache each time it
+reads one of these fields, and invalidates them after it changes them
+
+the cache is only used if the config file has a 'cache' section, and
+it is best-effort: if it cannot be written, a warning is issued once
+and the commands proceed without it
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+DEFAULT_DIRECTORY = "/var/lib/sopnode/liveboot/cache"
+
+# the directories that could not be written, so as to warn only once
+_UNWRITABLE = set()
+
+
+@dataclass
+class NodeStateCache:
+    directory: str = DEFAULT_DIRECTORY
+    # in seconds; entries older than that are ignored by default
+    ttl: float = 300
+
+    def __repr__(self):
+        return f"NodeStateCache {self.directory}"
+
+    @staticmethod
+    def from_config(config) -> "NodeStateCache":
+        """
+        build from the optional 'cache' section in the config;
+        returns None if there is no such section
+        """
+        if 'cache' not in config:
+            return None
+        cache_config = config['cache'] or {}
+        return NodeStateCache(
+            directory=cache_config.get('directory', DEFAULT_DIRECTORY),
+            ttl=cache_config.get('ttl', 300),
+        )
+
+
+    def _path(self, key):
+        return f"{self.directory}/{key}.json"
+
+    def load(self, key) -> dict:
+        """
+        the raw contents for that node, i.e. a dict like
+        {'power': {'value': 'On', 'time': 1678112345.6}, ...}
+        """
+        try:
+            with open(self._path(key)) as feed:
+                return json.load(feed)
+        except (IOError, json.JSONDecodeError):
+            return {}
+
+    @contextmanager
+    def _update(self, key):
+        """
+        read-modify-write the contents for that node, under a lock
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self._path(key)}.lock", 'w') as lockfile:
+            fcntl.flock(lockfile, fcntl.LOCK_EX)
+            contents = self.load(key)
+            yield contents
+            tmp = f"{self._path(key)}.{os.getpid()}"
+            with open(tmp, 'w') as writer:
+                json.dump(contents, writer)
+            os.replace(tmp, self._path(key))
+
+
+    def get(self, key, field, max_age=None) -> tuple | None:
+        """
+        returns a (value, age) tuple, or None if the field is unknown or too old
+
+        max_age defaults to the cache ttl
+        """
+        max_age = self.ttl if max_age is None else max_age
+        entry = self.load(key).get(field)
+        if entry is None:
+            return None
+        age = time.time() - entry['time']
+        if age > max_age:
+            return None
+        return entry['value'], age
+
+    def _warn(self, exc):
+        if self.directory not in _UNWRITABLE:
+            logging.warning(f"{self}: cannot write ({exc}) - proceeding without the cache")
+            _UNWRITABLE.add(self.directory)
+
+    def put(self, key, field, value) -> None:
+        try:
+            with self._update(key) as contents:
+                contents[field] = {'value': value, 'time': time.time()}
+        except OSError as exc:
+            self._warn(exc)
+
+    def invalidate(self, key, *fields) -> None:
+        try:
+            with self._update(key) as contents:
+                for field in fields:
+                    contents.pop(field, None)
+        except OSError as exc:
+            self._warn(exc)
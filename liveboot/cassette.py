@@ -0,0 +1,210 @@
+# pylint: disable=missing-function-docstring
+# pylint: disable=logging-fstring-interpolation
+
+"""
+record and replay the Redfish traffic of an Idrac
+
+a cassette is a JSON-lines file, with one exchange per line, like e.g.
+{"method": "GET", "url": "/redfish/v1/...", "body": null,
+ "status": 200, "headers": {...}, "text": "...", "elapsed": 0.42}
+
+* RecordingClient wraps a redfish client, and appends each exchange
+  to the cassette as it happens; secrets are redacted, and the BMC
+  address is replaced with 'bmc' - both on the parsed JSON, so that
+  neither the keys nor the URLs get altered
+* ReplayClient stands for a redfish client, and serves the exchanges
+  from a cassette, at the recorded speed or faster; at the end it can
+  tell how many requests were issued, compared to the recording
+"""
+
+import re
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+
+import redfish
+
+# the response headers worth keeping
+KEPT_HEADERS = ('content-type', 'location', 'retry-after')
+# the fields whose value gets redacted
+SECRET_KEYS = re.compile(r'password|token', re.I)
+REDACTED = '<redacted>'
+
+
+# the cassettes that this process has started recording
+_STARTED = set()
+_STARTED_LOCK = threading.Lock()
+
+def start_cassette(path) -> None:
+    """
+    empty the cassette the first time this process records in it, so that
+    a cassette holds one run only; later sessions of the same run append
+    """
+    with _STARTED_LOCK:
+        if path in _STARTED:
+            return
+        with open(path, 'w'):
+            pass
+        _STARTED.add(path)
+
+
+class CassetteMismatch(RuntimeError):
+    """
+    a replayed request that does not appear in the cassette
+    """
+
+
+def _host_pattern(host):
+    """
+    matches the host only on its boundaries,
+    so that e.g. 10.0.0.1 does not match within 10.0.0.13
+    """
+    return re.compile(rf"(?<![\w.-]){re.escape(host)}(?![\w-]|\.\w)")
+
+
+def _redact(data, secrets=(), host=None):
+    """
+    structurally: the values of the secret keys, the string values
+    that are one of the secrets, and the host in the string values
+    """
+    if isinstance(data, dict):
+        return {k: REDACTED if SECRET_KEYS.search(k) else _redact(v, secrets, host)
+                for k, v in data.items()}
+    if isinstance(data, list):
+        return [_redact(x, secrets, host) for x in data]
+    if isinstance(data, str):
+        if data in secrets:
+            return REDACTED
+        if host:
+            return host.sub('bmc', data)
+    return data
+
+
+@dataclass
+class RecordingClient:
+    client: object
+    path: str
+    # the BMC address
+    bmc: str = None
+    # e.g. the password, to be redacted wherever it appears as a value
+    secrets: tuple = ()
+    host: re.Pattern = field(init=False, default=None, repr=False)
+
+    def __post_init__(self):
+        self.secrets = tuple(secret for secret in self.secrets if secret)
+        if self.bmc:
+            self.host = _host_pattern(self.bmc)
+
+    def _redact(self, data):
+        return _redact(data, self.secrets, self.host)
+
+    def _write(self, exchange):
+        with open(self.path, 'a') as writer:
+            writer.write(json.dumps(exchange) + "\n")
+
+    def record_login(self, elapsed):
+        self._write({'method': 'LOGIN', 'url': '', 'elapsed': elapsed})
+
+    def _record(self, method, url, body, send):
+        exchange = {'method': method, 'url': self._redact(url), 'body': self._redact(body)}
+        begin = time.perf_counter()
+        try:
+            response = send()
+        except Exception as exc:
+            exchange['error'] = type(exc).__name__
+            exchange['elapsed'] = time.perf_counter() - begin
+            self._write(exchange)
+            raise
+        exchange['elapsed'] = time.perf_counter() - begin
+        exchange['status'] = response.status
+        exchange['headers'] = self._redact({
+            k.lower(): v for k, v in response.getheaders() if k.lower() in KEPT_HEADERS})
+        try:
+            exchange['text'] = json.dumps(self._redact(json.loads(response.text)))
+        except json.JSONDecodeError:
+            exchange['text'] = self._redact(response.text)
+        self._write(exchange)
+        return response
+
+    def get(self, url, **kwargs):
+        return self._record(
+            'GET', url, None, lambda: self.client.get(url, **kwargs))
+
+    def post(self, url, headers=None, body=None, **kwargs):
+        return self._record(
+            'POST', url, body,
+            lambda: self.client.post(url, headers=headers, body=body, **kwargs))
+
+    def patch(self, url, headers=None, body=None, **kwargs):
+        return self._record(
+            'PATCH', url, body,
+            lambda: self.client.patch(url, headers=headers, body=body, **kwargs))
+
+    def logout(self):
+        self.client.logout()
+
+
+@dataclass
+class ReplayClient:
+    path: str
+    # 1 is the recorded speed, 10 is 10 times faster, 0 means no delay at all
+    speed: float = 1
+    exchanges: list = field(default_factory=list)
+    expected: int = 0
+    served: int = 0
+    recorded_elapsed: float = 0
+    replayed_elapsed: float = 0
+    # the pipeline tasks replay from several threads
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        with open(self.path) as feed:
+            self.exchanges = [json.loads(line) for line in feed if line.strip()]
+        self.expected = len(self.exchanges)
+        self.recorded_elapsed = sum(x['elapsed'] for x in self.exchanges)
+
+    def _replay(self, method, url):
+        with self.lock:
+            for index, exchange in enumerate(self.exchanges):
+                if exchange['method'] == method and exchange['url'] == url:
+                    del self.exchanges[index]
+                    break
+            else:
+                raise CassetteMismatch(f"{method} {url} not found in {self.path}")
+            self.served += 1
+            self.replayed_elapsed += exchange['elapsed']
+        if self.speed:
+            time.sleep(exchange['elapsed'] / self.speed)
+        if 'error' in exchange:
+            raise redfish.rest.v1.RetriesExhaustedError(
+                f"replayed {exchange['error']}")
+        return redfish.rest.v1.StaticRestResponse(
+            Status=exchange.get('status'),
+            Headers=exchange.get('headers', {}),
+            Content=exchange.get('text', ''))
+
+    def login(self) -> "ReplayClient":
+        self._replay('LOGIN', '')
+        return self
+
+    def get(self, url, **_kwargs):
+        return self._replay('GET', url)
+
+    def post(self, url, **_kwargs):
+        return self._replay('POST', url)
+
+    def patch(self, url, **_kwargs):
+        return self._replay('PATCH', url)
+
+    def logout(self):
+        pass
+
+    def show_summary(self) -> None:
+        print(f"replayed {self.served} requests out of {self.expected}"
+              f" recorded in {self.path}")
+        print(f"Redfish time {self.replayed_elapsed:.2f}s"
+              f" - was {self.recorded_elapsed:.2f}s when recorded")
+        for exchange in self.exchanges:
+            logging.info(f"not replayed: {exchange['method']} {exchange['url']}")
@@ -13,6 +13,9 @@ import sys
 import os
 import time
 import logging
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from argparse import ArgumentParser
 from pathlib import Path
 from importlib import resources
@@ -21,6 +24,16 @@ import requests
 import yaml
 
 from .idrac import Idrac
+from .scheduler import Scheduler, JobCancelled, NotScheduled
+from .cache import NodeStateCache
+from .inventory import InventoryStore
+from .resilience import RetryPolicy, CircuitBreaker, BmcUnavailable
+from .cassette import ReplayClient, start_cassette
+from .waitloop import WaitLoop
+from .pipeline import Pipeline
+from .watch import NodeWatch, watch as watch_nodes
+from .transport import ADAPTERS
+from .boots import BootLog
 from .version import __version__ as liveboot_version
 
 
@@ -41,37 +54,203 @@ def locate_subcommand(subcommand, tail=None):
     return globals().get(varname, None)
 
 
+# the ReplayClient instances created so far, to show their summary at the end
+REPLAYERS = []
+
 def make_idrac(config, stem):
+    """
+    the optional 'cassettes' section in the config - also
+    set by --record and --replay - has the directory where
+    to record or replay one cassette per node
+    """
     node = config['nodes'][stem]
-    return Idrac(node['drac'], node['drac-username'], node['drac-password'])
+    cassettes = config.get('cassettes', {})
+    record_to, replayer = None, None
+    if cassettes.get('record'):
+        os.makedirs(cassettes['record'], exist_ok=True)
+        record_to = f"{cassettes['record']}/{stem}.cassette"
+        start_cassette(record_to)
+    if cassettes.get('replay'):
+        replayer = ReplayClient(
+            f"{cassettes['replay']}/{stem}.cassette", speed=cassettes.get('speed', 1))
+        REPLAYERS.append(replayer)
+    # a replay should neither use nor pollute the cache
+    cache = NodeStateCache.from_config(config) if not replayer else None
+    return Idrac(node['drac'], node['drac-username'], node['drac-password'],
+                 cache=cache,
+                 policy=RetryPolicy.from_config(config),
+                 breaker=CircuitBreaker.from_config(config, node['drac'], cache),
+                 record_to=record_to, replayer=replayer)
+
+
+def replaying(config) -> bool:
+    """
+    a replay runs offline: no lease, no image server, no seed, no boot log
+    """
+    return bool(config.get('cassettes', {}).get('replay'))
+
+
+def scheduled(bandwidth=False):
+    """
+    for the subcommands that change the state of a node:
+    they are submitted to the local scheduler, and only run
+    once they hold the lease on that node
+
+    bandwidth should be set for the ones that make the node
+    pull an image from the image server
+    """
+    def decorator(fun):
+        @functools.wraps(fun)
+        def wrapped(config, args):
+            # no need to wait for a dry run, or a replay
+            if getattr(args, 'dry_run', False) or replaying(config):
+                return fun(config, args)
+            scheduler = Scheduler.from_config(config)
+            try:
+                with scheduler.lease(args.stem, fun.__name__,
+                                     priority=args.priority, bandwidth=bandwidth):
+                    return fun(config, args)
+            except NotScheduled as exc:
+                logging.error(f"{fun.__name__} {args.stem} did not run: {exc}")
+                return 1
+            except JobCancelled as exc:
+                logging.error(f"{fun.__name__} {args.stem} interrupted: {exc}")
+                return 1
+        return wrapped
+    return decorator
 
 
 
 @subcommand
 def status(config, args):
     hostname = config['nodes'][args.stem]['hostname']
-    with make_idrac(config, args.stem) as idrac:
+    if args.max_age is not None:
+        max_age = args.max_age
+    elif args.cached:
+        # i.e. the cache ttl
+        max_age = None
+    else:
+        # always probe the box, the cache is only written
+        max_age = 0
+    show_age = max_age != 0
+    if show_age and NodeStateCache.from_config(config) is None:
+        logging.warning("no 'cache' section in the config - probing the iDRAC")
+        show_age = False
+    # do not log in unless we need to
+    idrac = make_idrac(config, args.stem)
+    try:
         print(f"{10*'-'} status of {hostname} - iDRAC {idrac}")
         D = {}
-        D['power state'] = idrac.get_power_state()
-        bios_settings = idrac.get_bios_attributes()
-        for attribute in config['status']['bios']:
-            D[attribute] = bios_settings[attribute]
-        for media in idrac.get_virtual_medias():
-            D.update(idrac.virtual_media_status(media))
+        ages = {}
+        try:
+            D['power state'], ages['power state'] = idrac.cached('power', max_age)
+            bios_settings, bios_age = idrac.cached('bios', max_age)
+            for attribute in config['status']['bios']:
+                D[attribute] = (bios_settings or {}).get(attribute, '???')
+                ages[attribute] = bios_age
+            medias, medias_age = idrac.cached('media', max_age)
+            for slot, image in (medias or {}).items():
+                D[slot], ages[slot] = image, medias_age
+        except BmcUnavailable as exc:
+            logging.error(exc)
+        D['BMC health'] = idrac.breaker.health()
         ping_reachable = os.system(f"ping -c 1 -w 1 {hostname} < /dev/null >& /dev/null") == 0
         D['PING'] = 'OK' if ping_reachable else 'KO'
         ssh_reachable = os.system(f"nc --wait 0.5 {hostname} 22 < /dev/null >& /dev/null") == 0
         D['SSH'] = 'OK' if ssh_reachable else 'KO'
         margin = max(map(len, D.keys()))
         for k, v in D.items():
-            print(f"{k:>{margin}}: {v}")
+            age = f" ({ages[k]:.0f}s ago)" if show_age and k in ages else ""
+            print(f"{k:>{margin}}: {v}{age}")
+    finally:
+        idrac.logout()
 
 def status_add_arguments(parser):
+    parser.add_argument("-c", "--cached", default=False, action='store_true',
+                        help="use the cached state if not older than the cache ttl")
+    parser.add_argument("-m", "--max-age", default=None, type=float,
+                        help="use the cached state if not older than that, in seconds")
     parser.add_argument("stem")
 
 
 
+@subcommand
+def cacherefresh(config, args):
+    stems = args.stems or list(config['nodes'].keys())
+    def refresh(stem):
+        try:
+            with make_idrac(config, stem) as idrac:
+                # all these write through the cache
+                idrac.get_power_state()
+                idrac.get_bios_attributes()
+                idrac.get_virtual_medias()
+        except Exception as exc:                        # pylint: disable=broad-except
+            logging.error(f"could not refresh {stem}: {exc}")
+    if (cache := NodeStateCache.from_config(config)) is None:
+        logging.error("cacherefresh: no 'cache' section in the config")
+        return 1
+    period = args.period or cache.ttl / 2
+    while True:
+        with ThreadPoolExecutor(max_workers=len(stems)) as executor:
+            executor.map(refresh, stems)
+        if not args.loop:
+            return 0
+        time.sleep(period)
+
+def cacherefresh_add_arguments(parser):
+    parser.add_argument("-l", "--loop", default=False, action='store_true',
+                        help="keep on refreshing, e.g. when run as a service")
+    parser.add_argument("-p", "--period", default=None, type=float,
+                        help="in loop mode, defaults to half the cache ttl")
+    parser.add_argument("stems", nargs='*',
+                        help="defaults to all nodes")
+
+
+
+@subcommand
+def inventory(config, args):
+    store = InventoryStore.from_config(config)
+    stems = args.stems or list(config['nodes'].keys())
+    if not args.cached:
+        def collect(stem):
+            try:
+                with make_idrac(config, stem) as idrac:
+                    return idrac.get_inventory()
+            except Exception as exc:                    # pylint: disable=broad-except
+                logging.error(f"could not collect inventory on {stem}: {exc}")
+                return None
+        with ThreadPoolExecutor(max_workers=len(stems)) as executor:
+            inventories = list(executor.map(collect, stems))
+        # write from the main thread only
+        changed = 0
+        try:
+            for stem, node_inventory in zip(stems, inventories):
+                if node_inventory is not None and store.update(stem, node_inventory):
+                    changed += 1
+        except sqlite3.Error as exc:
+            logging.error(f"inventory: {store} is not usable: {exc}")
+            return 1
+        logging.info(f"inventory: {changed} node(s) changed"
+                     f" out of {len(stems)}")
+    try:
+        store.show(args.stems, args.kind, args.pattern)
+    except sqlite3.Error as exc:
+        logging.error(f"inventory: {store} is not usable: {exc}")
+        return 1
+    return 0
+
+def inventory_add_arguments(parser):
+    parser.add_argument("-c", "--cached", default=False, action='store_true',
+                        help="only show what is already in the local store")
+    parser.add_argument("-k", "--kind", default=None,
+                        choices=('system', 'processor', 'memory', 'nic', 'firmware'))
+    parser.add_argument("-p", "--pattern", default=None,
+                        help="only show the fields that match that regexp")
+    parser.add_argument("stems", nargs='*',
+                        help="defaults to all nodes")
+
+
+
 @subcommand
 def biosget(config, args):
     with make_idrac(config, args.stem) as idrac:
@@ -83,19 +262,28 @@ def biosget_add_arguments(parser):
 
 
 
-@subcommand
-def biosset(config, args):
-    if not args.settings:
-        print("no setting to implement - exiting")
-        return 1
+def parse_settings(settings) -> dict:
+    """
+    turn ['name=value', ...] into a dict; returns None if ill-formed
+    """
     new_values = {}
-    for setting in args.settings:
+    for setting in settings:
         try:
             name, value = setting.split('=')
             new_values[name] = value
         except ValueError:
             print(f"incorrect setting {setting}")
-            return 1
+            return None
+    return new_values
+
+@subcommand
+@scheduled()
+def biosset(config, args):
+    if not args.settings:
+        print("no setting to implement - exiting")
+        return 1
+    if (new_values := parse_settings(args.settings)) is None:
+        return 1
 
     with make_idrac(config, args.stem) as idrac:
         idrac.set_bios_attributes(new_values)
@@ -108,6 +296,7 @@ def biosset_add_arguments(parser):
 
 
 @subcommand
+@scheduled()
 def biosreset(config, args):
     with make_idrac(config, args.stem) as idrac:
         idrac.bios_reset()
@@ -129,6 +318,7 @@ def queueget_add_arguments(parser):
 
 
 @subcommand
+@scheduled()
 def queueclear(config, args):
     with make_idrac(config, args.stem) as idrac:
         idrac.clear_queue(args.job_id)
@@ -139,19 +329,55 @@ def queueclear_add_arguments(parser):
 
 
 @subcommand
+def schedget(config, args):
+    Scheduler.from_config(config).show_jobs(args.all)
+
+def schedget_add_arguments(parser):
+    parser.add_argument("-a", "--all", default=False, action='store_true',
+                        help="by default, only pending and running jobs are shown")
+
+
+@subcommand
+def schedcancel(config, args):
+    return 0 if Scheduler.from_config(config).cancel(args.job_id) else 1
+
+def schedcancel_add_arguments(parser):
+    parser.add_argument("job_id", type=int)
+
+
+@subcommand
+@scheduled()
 def diskboot(config, args):
-    with make_idrac(config, args.stem) as l:
-        l.eject_virtual_media(1)
-        l.eject_virtual_media(2)
-        l.reboot()
+    with make_idrac(config, args.stem) as idrac:
+        plan = idrac.plan_virtual_medias({1: None, 2: None})
+        if plan is None:
+            logging.error("diskboot: cannot read the virtual medias")
+            return 1
+        plan.show()
+        if args.dry_run:
+            return 0
+        if not idrac.apply_media_plan(plan):
+            logging.error("diskboot emergency exit")
+            return 1
+        idrac.reboot()
+    return 0
 
 def diskboot_add_arguments(parser):
+    parser.add_argument("-n", "--dry-run", default=False, action='store_true',
+                        help="only show what needs to be done")
     parser.add_argument("stem")
 
 
 
-@subcommand
-def liveboot(config, args):
+def liveboot_pipeline(config, args, idrac, name="liveboot", extra_tasks=None) -> Pipeline:
+    """
+    the tasks of a liveboot, as per args.image, args.profile and args.dry_run
+
+    extra_tasks is an optional function that adds more tasks to the pipeline,
+    once it has the 'login' task; it returns a (before_changes, before_power_on)
+    tuple, with the names of the tasks that must be done before the node
+    gets changed in any way, and before it is powered on, respectively
+    """
     images_config = config['images']
     proto = images_config.get('proto', 'http')
     ip = images_config.get('ip')
@@ -163,12 +389,19 @@ def liveboot(config, args):
     image = f"{image_path.stem}.iso"
     url_prefix = f"{proto}://{ip}:{port}/{path}"
     url1 = f"{url_prefix}/{image}"
-
-    # check image can be found
-    if (code := (requests.head(url1).status_code)) // 100 != 2:
-        logging.error(f"got HHTP code {code} with {url1}")
-        logging.error(f"this image does not seem to exist")
-        return 1
+    # the optional 'profiles' subsection maps image stems to seed profiles
+    profile = args.profile or images_config.get('profiles', {}).get(
+        image_path.stem, images_config.get('default-profile', 'full'))
+
+    def check_image():
+        if replaying(config):
+            logging.info(f"replay: not checking {url1}")
+            return True
+        if (code := (requests.head(url1).status_code)) // 100 != 2:
+            logging.error(f"got HHTP code {code} with {url1}")
+            logging.error(f"this image does not seem to exist")
+            return False
+        return True
 
     stem = args.stem
     packaged_data = resources.files('liveboot')
@@ -179,33 +412,267 @@ def liveboot(config, args):
     keysfile = "/etc/sopnode/sopnode-keys.yaml"
     seed = f"cidata-seed-{stem}.iso"
     path_to_seed = f"{images_config['absolute-path']}/{seed}"
-    command = f"seed-cloud-init.sh {stem} {keysfile} {template} {path_to_seed}"
-    logging.info(f"running command {command}")
-    if os.system(command) != 0:
-        logging.error(f"could not generate cidata seed")
-        return 1
-
     url2 = f"{url_prefix}/{seed}"
 
-    with make_idrac(config, args.stem) as idrac:
-        if not (
-            idrac.insert_virtual_media(1, url1)
-        and idrac.insert_virtual_media(2, url2)
-        # ignore result
-        and (idrac.show_virtual_medias() or True)
-        and idrac.set_next_one_time_boot_virtual_media_device(1)):
-            logging.error("liveboot emergency exit")
-            return 1
-        idrac.reboot()
+    def build_seed():
+        """
+        returns the slots to re-insert even if unchanged
+        """
+        def seed_mtime():
+            return os.path.getmtime(path_to_seed) if os.path.exists(path_to_seed) else None
+        previous_mtime = seed_mtime()
+        command = f"seed-cloud-init.sh {stem} {keysfile} {template} {path_to_seed} {profile}"
+        if args.dry_run or replaying(config):
+            mode = 'dry-run' if args.dry_run else 'replay'
+            logging.info(f"{mode}: not running command {command}")
+        else:
+            logging.info(f"running command {command}")
+            if os.system(command) != 0:
+                logging.error(f"could not generate cidata seed")
+                return False
+        # the script leaves the seed untouched if its contents would not change;
+        # otherwise the iDRAC needs to see it re-inserted
+        return () if seed_mtime() == previous_mtime else (2,)
+
+    # the local work, the login and the initial reads are all independent
+    pipeline = Pipeline(name)
+    pipeline.add("check-image", check_image)
+    pipeline.add("seed", build_seed)
+    pipeline.add("login", idrac.login)
+    pipeline.add("read-medias", lambda: idrac.get_virtual_medias() or False,
+                 depends=("login",))
+    pipeline.add("read-bootonce", idrac.get_next_one_time_boot_device,
+                 depends=("login",))
+    pipeline.add("read-power", lambda: idrac.get_power_state() or False,
+                 depends=("login",))
+    def make_plan():
+        plan = idrac.make_media_plan(
+            pipeline.result("read-medias"), pipeline.result("read-bootonce"),
+            {1: url1, 2: url2}, boot_device=1, force=pipeline.result("seed"))
+        plan.show()
+        return plan
+    pipeline.add("plan", make_plan,
+                 depends=("check-image", "seed", "read-medias", "read-bootonce"))
+    before_changes, before_power_on = extra_tasks(pipeline) if extra_tasks else ((), ())
+    if not args.dry_run:
+        # the shutdown starts as soon as the medias are set,
+        # while the boot device gets set
+        pipeline.add("medias",
+                     lambda: idrac.apply_media_plan(
+                         pipeline.result("plan").subset('eject', 'insert')),
+                     depends=("plan", *before_changes))
+        pipeline.add("bootonce",
+                     lambda: idrac.apply_media_plan(
+                         pipeline.result("plan").subset('bootonce')),
+                     depends=("medias",))
+        def shutdown():
+            match (state := pipeline.result("read-power")):
+                case 'On':
+                    return idrac.off()
+                case 'Off':
+                    return True
+                case _:
+                    logging.error(f"cannot reboot server in state {state}")
+                    return False
+        pipeline.add("shutdown", shutdown, depends=("medias", "read-power"))
+        def power_on():
+            if not idrac.on():
+                return False
+            # so that wait can measure the time to ssh;
+            # this must not turn a successful boot into a failure
+            if not replaying(config):
+                try:
+                    BootLog.from_config(config).record_boot(stem, image_path.stem, profile)
+                except (sqlite3.Error, OSError) as exc:
+                    logging.warning(f"could not record the boot: {exc}")
+            return True
+        pipeline.add("power-on", power_on,
+                     depends=("shutdown", "bootonce", *before_power_on))
+    return pipeline
+
+
+def power_back_on(pipeline, idrac) -> None:
+    """
+    the shutdown runs in parallel with other tasks; if one of these
+    has failed, power-on gets skipped; in that case, turn the node
+    back on if it was on, rather than leaving it off
+    """
+    tasks = pipeline.tasks
+    if 'shutdown' not in tasks or tasks['shutdown'].state != 'done':
+        return
+    if tasks['power-on'].state == 'done':
+        return
+    if pipeline.result("read-power") != 'On':
+        logging.warning(f"{pipeline}: the node was off, and is left off")
+        return
+    if tasks['power-on'].state == 'skipped':
+        logging.warning(f"{pipeline}: turning the node back on, as it was")
+        if idrac.on():
+            return
+    logging.error(f"{pipeline}: the node has been shut down, and is left OFF")
+
+
+@subcommand
+@scheduled(bandwidth=True)
+def liveboot(config, args):
+    idrac = make_idrac(config, args.stem)
+    pipeline = liveboot_pipeline(config, args, idrac)
+    try:
+        success = pipeline.run()
+        if not success:
+            power_back_on(pipeline, idrac)
+    finally:
+        idrac.logout()
+    pipeline.show_timings()
+    if not success:
+        logging.error("liveboot emergency exit")
+        return 1
     return 0
 
 def liveboot_add_arguments(parser):
     parser.add_argument("-i", "--image", default="f37-sopnode-liveboot.iso")
+    parser.add_argument("-p", "--profile", default=None,
+                        choices=("full", "fast", "minimal"),
+                        help="the cloud-init seed profile;"
+                             " defaults to the one configured for the image, or full")
+    parser.add_argument("-n", "--dry-run", default=False, action='store_true',
+                        help="only show what needs to be done")
+    parser.add_argument("stem")
+
+
+
+@subcommand
+@scheduled(bandwidth=True)
+def prepare(config, args):
+    """
+    biosreset + biosset + liveboot, within a single power cycle
+    """
+    if (new_values := parse_settings(args.settings)) is None:
+        return 1
+    idrac = make_idrac(config, args.stem)
+
+    def bios_tasks(pipeline):
+        def plan_bios():
+            """
+            returns the settings to apply, what the reset is expected to change,
+            and the settings as checked against the registry
+            """
+            # nothing gets changed on the node until the settings are known valid
+            if (checked := idrac.check_bios_values(new_values)) is None:
+                return False
+            if (changes := idrac.plan_bios(checked, reset=args.reset)) is None:
+                logging.error("cannot read the BIOS settings")
+                return False
+            expected = {}
+            if args.reset:
+                if (expected := idrac.plan_bios_reset(keep=checked)) is None:
+                    logging.error("cannot read the BIOS registry")
+                    return False
+                print(f"bios reset ({len(expected)} settings back to their defaults)")
+            for setting, value in changes.items():
+                print(f"bios {setting}={value}")
+            return changes, expected, checked
+        pipeline.add("bios-plan", plan_bios, depends=("login",))
+        if args.dry_run:
+            return ("bios-plan",), ()
+        # both only get applied upon the next power cycle
+        pipeline.add("bios-reset",
+                     lambda: bool(idrac.bios_reset()) if args.reset else True,
+                     depends=("bios-plan",))
+        def bios_settings():
+            """
+            returns the id of the config job, if any
+            """
+            changes, *_ = pipeline.result("bios-plan")
+            if not changes:
+                return None
+            return idrac.schedule_bios_attributes(changes) or False
+        pipeline.add("bios-settings", bios_settings, depends=("bios-reset",))
+        return ("bios-plan",), ("bios-settings",)
+
+    pipeline = liveboot_pipeline(
+        config, args, idrac, name="prepare", extra_tasks=bios_tasks)
+    if not args.dry_run:
+        def verify():
+            """
+            the config job must complete, and then the settings must show
+            the new values; as for the reset, the registry defaults are only
+            a hint - some firmwares have their own - so a mismatch there
+            only gets a warning
+            """
+            if (job_id := pipeline.result("bios-settings")):
+                state = idrac.wait_for_jobs([job_id])[job_id]
+                if state != 'Completed':
+                    logging.error(f"BIOS job {job_id} is {state}")
+                    return False
+            _, expected, checked = pipeline.result("bios-plan")
+            def mismatches(wanted, current):
+                current = {k.lower(): str(v).lower() for k, v in current.items()}
+                return {setting: value for setting, value in wanted.items()
+                        if current.get(setting.lower()) != str(value).lower()}
+            def reset_shows(current):
+                return not expected or len(mismatches(expected, current)) < len(expected)
+            def settled(current):
+                # a completed job means the POST is over; a reset alone
+                # has no job, its effect is the only sign of it
+                return not mismatches(checked, current) and (job_id or reset_shows(current))
+            current = {}
+            try:
+                with WaitLoop(timeout=120 if job_id else 900, period=15) as waitloop:
+                    while not settled(current := idrac.get_bios_attributes() or {}):
+                        waitloop.tick()
+            except TimeoutError:
+                if (missing := mismatches(checked, current)):
+                    for setting, value in missing.items():
+                        logging.error(f"{idrac}: {setting} is not set to {value}")
+                    if expected and reset_shows(current):
+                        logging.error("the BIOS reset has overwritten the new settings")
+                    return False
+            if not reset_shows(current):
+                logging.warning(f"{idrac}: the BIOS reset does not seem to have been applied")
+            else:
+                for setting, value in mismatches(expected, current).items():
+                    logging.warning(f"{idrac}: {setting} is not back to its default {value}")
+            return True
+        pipeline.add("verify", verify, depends=("power-on",))
+    try:
+        success = pipeline.run()
+        if not success:
+            power_back_on(pipeline, idrac)
+    finally:
+        idrac.logout()
+    pipeline.show_timings()
+    if not success:
+        logging.error("prepare emergency exit")
+        return 1
+    if not args.dry_run:
+        # one by one, the reset and the settings would cost a power cycle each
+        changes, *_ = pipeline.result("bios-plan")
+        cycles = 1 + bool(args.reset) + bool(changes)
+        cycle = sum(pipeline.tasks[name].duration
+                    for name in ("shutdown", "power-on", "verify"))
+        logging.info(f"{pipeline}: 1 power cycle ({cycle:.0f}s) instead of {cycles}"
+                     f" - saved about {(cycles - 1) * cycle:.0f}s")
+    return 0
+
+def prepare_add_arguments(parser):
+    parser.add_argument("-r", "--reset", default=False, action='store_true',
+                        help="reset the BIOS to its defaults, before applying the settings")
+    parser.add_argument("-i", "--image", default="f37-sopnode-liveboot.iso")
+    parser.add_argument("-p", "--profile", default=None,
+                        choices=("full", "fast", "minimal"),
+                        help="the cloud-init seed profile;"
+                             " defaults to the one configured for the image, or full")
+    parser.add_argument("-n", "--dry-run", default=False, action='store_true',
+                        help="only show what needs to be done")
     parser.add_argument("stem")
+    parser.add_argument("settings", nargs='*',
+                        help="BIOS settings, of the form setting=value")
 
 
 
 @subcommand
+@scheduled()
 def off(config, args):
     with make_idrac(config, args.stem) as idrac:
         return 0 if idrac.off() else 1
@@ -215,6 +682,7 @@ def off_add_arguments(parser):
     parser.add_argument("stem")
 
 @subcommand
+@scheduled()
 def on(config, args):
     with make_idrac(config, args.stem) as idrac:
         return 0 if idrac.on() else 1
@@ -223,6 +691,7 @@ def on_add_arguments(parser):
     parser.add_argument("stem")
 
 @subcommand
+@scheduled()
 def reboot(config, args):
     with make_idrac(config, args.stem) as idrac:
         if not idrac.off():
@@ -235,19 +704,57 @@ def reboot_add_arguments(parser):
 
 
 
+@subcommand
+def watch(config, args):
+    stems = args.stems or list(config['nodes'].keys())
+    watches = [
+        NodeWatch(stem, config['nodes'][stem]['hostname'], make_idrac(config, stem),
+                  min_interval=args.min_interval, max_interval=args.max_interval,
+                  interval=args.min_interval)
+        for stem in stems
+    ]
+    watch_nodes(watches, budget=args.budget)
+    return 0
+
+def watch_add_arguments(parser):
+    parser.add_argument("-b", "--budget", default=2., type=float,
+                        help="the overall number of requests per second to the iDRACs")
+    parser.add_argument("--min-interval", default=5., type=float,
+                        help="how often a node gets polled while its state changes")
+    parser.add_argument("--max-interval", default=120., type=float,
+                        help="how often a node gets polled once its state is stable")
+    parser.add_argument("stems", nargs='*',
+                        help="defaults to all nodes")
+
+
+
 @subcommand
 def wait(config, args):
     needs_newline = False
+    # only then do we know when the node became reachable
+    seen_unreachable = False
     hostname = config['nodes'][args.stem]['hostname']
     while True:
         if os.system(f"nc --wait 0.5 {hostname} 22 < /dev/null >& /dev/null") == 0:
             break
+        seen_unreachable = True
         time.sleep(args.period)
         if not args.silent:
             print('.', end="", flush=True)
             needs_newline = True
     if needs_newline:
         print()
+    if not seen_unreachable:
+        return 0
+    try:
+        boot = BootLog.from_config(config).record_ssh_ready(args.stem)
+    except (sqlite3.Error, OSError) as exc:
+        logging.warning(f"could not record the time to ssh: {exc}")
+        return 0
+    if boot:
+        image, profile, time_to_ssh = boot
+        logging.info(f"{args.stem}: ssh reachable {time_to_ssh:.0f}s"
+                     f" after power-on with {image} ({profile} seed)")
     return 0
 
 def wait_add_arguments(parser):
@@ -257,6 +764,11 @@ def wait_add_arguments(parser):
     parser.add_argument("stem")
 
 
+@subcommand
+def bootstats(config, args):
+    BootLog.from_config(config).show_stats()
+    return 0
+
 
 
 @subcommand
@@ -270,6 +782,19 @@ def main() -> int:
     parser = ArgumentParser()
     parser.add_argument("--config", default=CONFIG_FILENAME,
                         help="use another config file")
+    parser.add_argument("--priority", type=int, default=0,
+                        help="jobs with a higher priority get their turn first"
+                             " in the local scheduler")
+    parser.add_argument("--record", default=None, metavar="DIRECTORY",
+                        help="record the Redfish traffic, one cassette per node")
+    parser.add_argument("--replay", default=None, metavar="DIRECTORY",
+                        help="do not talk to the iDRACs, replay cassettes instead")
+    parser.add_argument("--stats", default=False, action='store_true',
+                        help="show, for each iDRAC, the number of requests and of"
+                             " TLS handshakes, and the average latencies")
+    parser.add_argument("--speed", default=1., type=float,
+                        help="when replaying, how much faster than recorded;"
+                             " 0 means no delay at all")
     subparsers = parser.add_subparsers(help="subcommand help")
     # add all the subcommands subparsers
     for subcommand in SUBCOMMANDS:
@@ -295,11 +820,31 @@ def main() -> int:
         parser.print_help()
         return 1
 
+    if args.record or args.replay:
+        config['cassettes'] = dict(
+            record=args.record, replay=args.replay, speed=args.speed)
+    if args.replay:
+        WaitLoop.speed = args.speed or float('inf')
+
     if getattr(args, 'stem', None) and args.stem not in known_stems:
         print(f"stem should be among one of {' '.join(known_stems)}")
         sys.exit(1)
+    for stem in getattr(args, 'stems', None) or []:
+        if stem not in known_stems:
+            print(f"stems should be among {' '.join(known_stems)}")
+            sys.exit(1)
 
-    return args.func(config, args)
+    try:
+        return args.func(config, args)
+    except BmcUnavailable as exc:
+        logging.error(exc)
+        return 1
+    finally:
+        for replayer in REPLAYERS:
+            replayer.show_summary()
+        if args.stats:
+            for adapter in ADAPTERS.values():
+                adapter.show_stats()
 
 if __name__ == '__main__':
     main()
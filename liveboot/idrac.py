@@ -3,10 +3,12 @@
 
 import sys
 import json
+import time
 from datetime import datetime as DateTime
 import logging
 import typing
 import re
+from urllib.parse import quote
 from pprint import pformat
 from dataclasses import dataclass
 
@@ -14,11 +16,87 @@ import jmespath
 import redfish
 
 from .waitloop import WaitLoop
+from .cache import NodeStateCache
+from .resilience import RetryPolicy, CircuitBreaker, BmcUnavailable
+from .cassette import RecordingClient, ReplayClient
+from .transport import get_adapter
 
 Client = redfish.rest.v1.HttpClient
 Response = redfish.rest.v1.RestResponse
 OptResponse = typing.Optional[Response]
 
+# what the redfish library raises when it cannot reach the box
+TRANSPORT_ERRORS = (
+    redfish.rest.v1.RetriesExhaustedError,
+    redfish.rest.v1.ServerDownOrUnreachableError,
+)
+# the HTTP codes that mean 'come back later'
+RETRY_LATER_CODES = (429, 503)
+
+# how the iDRAC names the virtual media devices, for booting
+BOOT_DEVICE_NAMES = {1: "VCD-DVD", 2: "vFDD"}
+
+
+@dataclass
+class MediaPlan:
+    """
+    what it takes to bring the virtual media slots, and
+    the next one-time boot device, in a desired state
+    """
+    # each action is a tuple like
+    # ('eject', 1), ('insert', 1, url) or ('bootonce', 1)
+    actions: list
+    # the number of requests it takes, including the ones to build the plan
+    round_trips: int
+    # same, with the naive approach, that ejects and re-inserts unconditionally
+    naive_round_trips: int
+
+    def subset(self, *kinds) -> "MediaPlan":
+        """
+        the same plan, restricted to these kinds of actions
+        """
+        return MediaPlan(
+            [action for action in self.actions if action[0] in kinds],
+            self.round_trips, self.naive_round_trips)
+
+    def show(self) -> None:
+        for action in self.actions:
+            print(" ".join(str(x) for x in action))
+        if not self.actions:
+            print("nothing to do")
+        print(f"{self.round_trips} round trips"
+              f" - saves {self.naive_round_trips - self.round_trips}"
+              f" out of {self.naive_round_trips}")
+
+
+# how to compact each kind of hardware component in the inventory
+INVENTORY_XPATHS = {
+    'system': (
+        "{Model: Model, ServiceTag: SKU, BiosVersion: BiosVersion,"
+        " ProcessorModel: ProcessorSummary.Model, Processors: ProcessorSummary.Count,"
+        " MemoryGiB: MemorySummary.TotalSystemMemoryGiB}"),
+    'processor': (
+        "{Id: Id, Model: Model, TotalCores: TotalCores,"
+        " TotalThreads: TotalThreads, MaxSpeedMHz: MaxSpeedMHz}"),
+    'memory': (
+        "{Id: Id, CapacityMiB: CapacityMiB, MemoryDeviceType: MemoryDeviceType,"
+        " OperatingSpeedMhz: OperatingSpeedMhz, Manufacturer: Manufacturer,"
+        " PartNumber: PartNumber}"),
+    # only what does not change at runtime; e.g. LinkStatus and SpeedMbps
+    # follow the state of the link, and would change the fingerprint
+    'nic': (
+        "{Id: Id, MACAddress: MACAddress, PermanentMACAddress: PermanentMACAddress}"),
+    'firmware': (
+        "{Id: Id, Name: Name, Version: Version}"),
+}
+
+# the collections under the System that hold the components
+INVENTORY_COLLECTIONS = {
+    'processor': 'Processors',
+    'memory': 'Memory',
+    'nic': 'EthernetInterfaces',
+}
+
 
 @dataclass
 class Idrac:
@@ -26,6 +104,27 @@ class Idrac:
     username: str
     password: str
     proxy: Client = None
+    # optional; if set, the power/bios/media states read
+    # from the box get written in there
+    cache: NodeStateCache = None
+    # timeouts and retries
+    policy: RetryPolicy = None
+    # fail fast with BMCs known to be down
+    breaker: CircuitBreaker = None
+    # record all Redfish exchanges in that cassette file
+    record_to: str = None
+    # or, instead of talking to the box, replay a cassette
+    replayer: ReplayClient = None
+    # the ProtocolFeaturesSupported section of the service root, fetched once
+    query_features: dict = None
+    # the BIOS registry, fetched once
+    bios_registry: dict = None
+
+    def __post_init__(self):
+        if self.policy is None:
+            self.policy = RetryPolicy()
+        if self.breaker is None:
+            self.breaker = CircuitBreaker(self.ip, cache=self.cache)
 
     def __repr__(self):
         return f"Liveboot {self.ip}"
@@ -34,17 +133,38 @@ class Idrac:
     def login(self):
         if self.proxy:
             return(f"Idrac {self} already logged in")
-        self.proxy = redfish.redfish_client(
-            base_url=f"https://{self.ip}/",
-            username=self.username,
-            password=self.password,
-        )
-        self.proxy.login(auth='session')
+        if self.replayer:
+            self.proxy = self.replayer.login()
+            return None
+        def connect():
+            proxy = redfish.redfish_client(
+                base_url=f"https://{self.ip}/",
+                username=self.username,
+                password=self.password,
+                timeout=self.policy.timeout,
+                # we do our own retries, only on idempotent requests
+                max_retry=0,
+                # keep-alive and TLS resumption, shared with other logins to that box
+                https_adapter=get_adapter(self.ip),
+            )
+            proxy.login(auth='session')
+            return proxy
+        begin = time.perf_counter()
+        self.proxy = self._resilient(connect, "login", idempotent=True)
+        if self.record_to:
+            self.proxy = RecordingClient(
+                self.proxy, self.record_to, bmc=self.ip, secrets=(self.password,))
+            self.proxy.record_login(time.perf_counter() - begin)
+        return None
 
     def logout(self):
         if not self.proxy:
             return(f"cannot logout Idrac {self}")
-        self.proxy.logout()
+        try:
+            self.proxy.logout()
+        except TRANSPORT_ERRORS as exc:
+            # the session will expire anyway
+            logging.warning(f"{self}: could not logout: {exc}")
         self.proxy = None
 
 
@@ -56,6 +176,39 @@ class Idrac:
         self.logout()
 
 
+    def _resilient(self, send, message, idempotent):
+        """
+        run send() - that issues one request - under the circuit breaker;
+        idempotent requests get retried with a backoff, upon transport
+        errors or when the box answers 429/503 (honoring Retry-After)
+
+        raises BmcUnavailable if the box cannot be reached
+        """
+        self.breaker.check()
+        attempts = 1 + (self.policy.retries if idempotent else 0)
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                response = send()
+            except TRANSPORT_ERRORS as exc:
+                if last:
+                    # one failure per request, once its retries are exhausted
+                    self.breaker.failure()
+                    raise BmcUnavailable(
+                        f"{self}: {message} failed: {type(exc).__name__} {exc}") from exc
+                delay = self.policy.delay(attempt)
+            else:
+                # the box has answered, so it is alive
+                self.breaker.success()
+                status = getattr(response, 'status', None)
+                if last or status not in RETRY_LATER_CODES:
+                    return response
+                delay = min(response.retry_after or self.policy.delay(attempt),
+                            self.policy.max_backoff)
+            logging.warning(f"{self}: {message} - retrying in {delay}s")
+            time.sleep(delay)
+
+
     # the generic _getter - using GET
     def _get(
             self, uri,
@@ -73,7 +226,8 @@ class Idrac:
         if not self.proxy:
             raise RuntimeError(f"can only send commands (name) when connected")
         url = f"{'/redfish/v1' if not raw else ''}/{prefix}{uri}"
-        response = self.proxy.get(url)
+        response = self._resilient(
+            lambda: self.proxy.get(url), f"GET {url}", idempotent=True)
         if response.status not in ok_codes:
             logging.error(f"{self}: {url} returned {response.status}")
             # xxx not sure if that's relevant, see _post for showing more details ?
@@ -87,6 +241,79 @@ class Idrac:
             return jmespath.search(xpath, data)
 
 
+    def get_query_features(self) -> dict:
+        """
+        which of $expand, $select and $filter the firmware supports
+        """
+        if self.query_features is None:
+            self.query_features = self._get(
+                "", prefix="", xpath="ProtocolFeaturesSupported") or {}
+        return self.query_features
+
+    def iter_members(self, uri, prefix="Systems/System.Embedded.1/",
+                     select=(), odata_filter=None, predicate=None):
+        """
+        a generator over the members of a collection, expanded one level
+
+        * the pages are fetched one at a time, following Members@odata.nextLink,
+          so that only one page is held in memory at any given time
+        * select: only fetch these properties of the members, if the firmware
+          supports $select (the caller must not rely on the others being absent)
+        * odata_filter: a $filter expression, used if the firmware supports it;
+          predicate is the same thing as a python function, applied otherwise
+
+        the firmware is not trusted blindly with $select: if the first page
+        comes without expanded members, $select is not used any longer
+
+        raises RuntimeError if a page cannot be retrieved, or has no Members
+        """
+        # no need for the extra request if there is nothing to ask for
+        features = self.get_query_features() if (select or odata_filter) else {}
+        params = ["$expand=*($levels=1)"]
+        selected = bool(select and features.get('SelectQuery'))
+        if selected:
+            # Id is how we check that $select applies to the members
+            select = dict.fromkeys(('Id', *select))
+            params.append(f"$select={','.join(select)}")
+        local_predicate = predicate
+        if odata_filter and features.get('FilterQuery'):
+            params.append(f"$filter={quote(odata_filter, safe='')}")
+            local_predicate = None
+        url = f"/redfish/v1/{prefix}{uri}?{'&'.join(params)}"
+        first = True
+        while url:
+            # nextLink is an absolute path
+            page = self._get(url.lstrip('/'), prefix="", raw=True)
+            if page is None:
+                raise RuntimeError(f"{self}: could not retrieve {url}")
+            members = page.get('Members')
+            if first and selected and (
+                    members is None or any('Id' not in member for member in members)):
+                logging.warning(f"{self}: $select does not apply to the members"
+                                f" of {uri} - not using it any longer")
+                self.query_features['SelectQuery'] = False
+                yield from self.iter_members(
+                    uri, prefix, select, odata_filter, predicate)
+                return
+            if members is None:
+                raise RuntimeError(f"{self}: no Members in {url}")
+            first = False
+            for member in members:
+                if local_predicate is None or local_predicate(member):
+                    yield member
+            url = page.get('Members@odata.nextLink')
+
+    def get_members(self, uri, **kwargs) -> list[dict]:
+        """
+        same as iter_members, as a list; returns None if anything goes wrong
+        """
+        try:
+            return list(self.iter_members(uri, **kwargs))
+        except RuntimeError as exc:
+            logging.error(exc)
+            return None
+
+
     # and the setter - using POST (or PATCH it patch is set)
     def _post(self, uri, payload,
             #*,  somehow adding this creates a lot of trouble...
@@ -102,10 +329,12 @@ class Idrac:
         headers = {'content-type': 'application/json'}
         if patch:
             msg = "PATCH"
-            response = self.proxy.patch(url, headers=headers, body=payload)
+            send = lambda: self.proxy.patch(url, headers=headers, body=payload)
         else:
             msg = "POST"
-            response = self.proxy.post(url, headers=headers, body=payload)
+            send = lambda: self.proxy.post(url, headers=headers, body=payload)
+        # actions are not idempotent, so no retry
+        response = self._resilient(send, f"{msg} {url}", idempotent=False)
         if response.status in ok_codes:
             return response
         else:
@@ -121,6 +350,41 @@ class Idrac:
             return False
 
 
+    # write-through helpers for the optional cache
+    def _remember(self, field, value):
+        if self.cache and value is not None:
+            self.cache.put(self.ip, field, value)
+        return value
+
+    def _invalidate(self, *fields):
+        if self.cache:
+            self.cache.invalidate(self.ip, *fields)
+
+    def cached(self, field, max_age=None) -> tuple:
+        """
+        returns a (value, age) tuple for one of the cached fields
+        i.e. 'power', 'bios' or 'media'
+
+        the value comes from the cache if it is recent enough
+        (max_age defaults to the cache ttl), otherwise it is
+        fetched from the box - logging in if needed - with an age of 0
+        """
+        if self.cache and (hit := self.cache.get(self.ip, field, max_age)):
+            return hit
+        if not self.proxy:
+            self.login()
+        match field:
+            case 'power':
+                value = self.get_power_state()
+            case 'bios':
+                value = self.get_bios_attributes()
+            case 'media':
+                value = self.get_virtual_medias_status()
+            case _:
+                raise ValueError(f"unknown cached field {field}")
+        return value, 0.
+
+
     # redfish has the notion of monitor() on a Client instance
     # https://github.com/DMTF/python-redfish-library#working-with-tasks
     # but it's hard to grasp what the context is for, so...
@@ -148,8 +412,8 @@ class Idrac:
 
 
     def get_power_state(self) -> str:
-        return self._get(
-            '', 'PowerState')
+        return self._remember('power', self._get(
+            '', 'PowerState'))
 
     def get_available_power_states(self) -> list[str]:
         return self._get(
@@ -157,6 +421,8 @@ class Idrac:
             'Actions."#ComputerSystem.Reset"."ResetType@Redfish.AllowableValues"')
 
     def set_power_state(self, newstate) -> bool:
+        # pending BIOS jobs get applied upon power cycles
+        self._invalidate('power', 'bios')
         return self._post(
             'Actions/ComputerSystem.Reset',
             {'ResetType': newstate})
@@ -173,16 +439,17 @@ class Idrac:
                 <snip>
             - Id: '2'
         """
-        return self._get(
-            "VirtualMedia?$expand=*($levels=1)",
-            "Members",
-        )
+        medias = self.get_members("VirtualMedia")
+        if medias is not None:
+            self._remember('media', self._virtual_medias_status(medias))
+        return medias
 
     def get_virtual_media(self, device) -> dict:
         """
         the 'Members' part of the above, for that device
+        or None if it cannot be found
         """
-        for media in self.get_virtual_medias():
+        for media in self.get_virtual_medias() or []:
             if int(media['Id']) == int(device):
                 return media
 
@@ -206,6 +473,23 @@ class Idrac:
                 return {name: f"??? {media['ConnectedVia']=}"}
 
 
+    @staticmethod
+    def _virtual_medias_status(medias) -> dict:
+        result = {}
+        for media in medias:
+            result.update(Idrac.virtual_media_status(media))
+        return result
+
+    def get_virtual_medias_status(self) -> dict:
+        """
+        the merged virtual_media_status() of all slots
+        """
+        medias = self.get_virtual_medias()
+        if medias is None:
+            return None
+        return self._virtual_medias_status(medias)
+
+
     def show_virtual_medias(self) -> None:
         medias = self.get_virtual_medias()
         if not medias:
@@ -221,6 +505,7 @@ class Idrac:
             logging.error(f"Wrong device index {device} - existing")
             return False
         payload = {'Image': uri, 'Inserted': True, 'WriteProtected': True}
+        self._invalidate('media')
         return self._post(
             f'VirtualMedia/{device}/Actions/VirtualMedia.InsertMedia',
             payload)
@@ -229,6 +514,7 @@ class Idrac:
         if device not in (1, 2):
             logging.error(f"Wrong device index {device} - existing")
             return False
+        self._invalidate('media')
         return self._post(
             f'VirtualMedia/{device}/Actions/VirtualMedia.EjectMedia',
             # empty payload
@@ -240,6 +526,9 @@ class Idrac:
         insert - does a first eject beforhand if needed
         """
         status = self.get_virtual_media(device)
+        if not status:
+            logging.error(f"{self}: cannot get the status of device {device}")
+            return False
         if status['ConnectedVia'] == 'URI':
             logging.info(f"device {device} is busy, ejecting first")
             self._eject_virtual_media(device)
@@ -250,6 +539,9 @@ class Idrac:
         eject but only if necessay
         """
         status = self.get_virtual_media(device)
+        if not status:
+            logging.error(f"{self}: cannot get the status of device {device}")
+            return False
         if status['ConnectedVia'] != 'URI':
             logging.info(f"device {device} already ejected")
             return
@@ -257,12 +549,96 @@ class Idrac:
 
 
 
+    def plan_virtual_medias(self, images: dict, boot_device=None, force=()) -> MediaPlan:
+        """
+        Parameters:
+          - images: the desired contents of the slots, e.g.
+            {1: 'http://some/image.iso', 2: None} where None means ejected
+          - boot_device: if set, the slot to boot from next time
+          - force: the slots to re-insert even if they already
+            show the right image - e.g. because its contents have changed
+        Returns:
+          - a MediaPlan, or None if the current state cannot be read
+        """
+        medias = self.get_virtual_medias()
+        if medias is None:
+            return None
+        next_boot_device = self.get_next_one_time_boot_device() if boot_device else None
+        return self.make_media_plan(medias, next_boot_device, images, boot_device, force)
+
+    @staticmethod
+    def make_media_plan(medias, next_boot_device, images: dict,
+                        boot_device=None, force=()) -> MediaPlan:
+        """
+        same as plan_virtual_medias, from an already known state, i.e.
+          - medias: as returned by get_virtual_medias()
+          - next_boot_device: as returned by get_next_one_time_boot_device()
+        """
+        current = {int(media['Id']): media['Image'] if media['ConnectedVia'] == 'URI' else None
+                   for media in medias}
+        actions = []
+        # one GET for all slots
+        round_trips = 1
+        naive = 0
+        for device, image in images.items():
+            connected = current.get(device) is not None
+            # the naive way: one GET for that slot, eject if needed, insert
+            naive += 1 + connected + (image is not None)
+            if current.get(device) == image and device not in force:
+                continue
+            if connected:
+                actions.append(('eject', device))
+            if image is not None:
+                actions.append(('insert', device, image))
+        if boot_device:
+            round_trips += 1
+            # the naive way: the import, and at least one GET on its task
+            naive += 2
+            if next_boot_device != boot_device:
+                actions.append(('bootonce', boot_device))
+                round_trips += 1
+        round_trips += len(actions)
+        return MediaPlan(actions, round_trips, naive)
+
+    def apply_media_plan(self, plan: MediaPlan) -> bool:
+        for action, device, *args in plan.actions:
+            match action:
+                case 'eject':
+                    result = self._eject_virtual_media(device)
+                case 'insert':
+                    result = self._insert_virtual_media(device, *args)
+                case 'bootonce':
+                    result = self.set_next_one_time_boot_virtual_media_device(device)
+                case _:
+                    raise ValueError(f"unknown action {action}")
+            if not result:
+                logging.error(f"{self}: could not {action} device {device}")
+                return False
+        return True
+
+
+    def get_next_one_time_boot_device(self) -> int:
+        """
+        the virtual media device that is set for the next boot, if any
+        """
+        attributes = self._get(
+            "iDRAC.Embedded.1",
+            prefix="Managers/iDRAC.Embedded.1/Oem/Dell/DellAttributes/",
+            xpath="Attributes",
+        )
+        if not attributes or attributes.get('ServerBoot.1.BootOnce') != 'Enabled':
+            return None
+        for device, device_name in BOOT_DEVICE_NAMES.items():
+            if attributes.get('ServerBoot.1.FirstBootDevice') == device_name:
+                return device
+        return None
+
     def set_next_one_time_boot_virtual_media_device(self, device: int) -> bool:
         if device not in (1, 2):
             logging.error(f"Wrong device index {device} - existing")
             return False
         url = 'Actions/Oem/EID_674_Manager.ImportSystemConfiguration'
-        device_name = "VCD-DVD" if device == 1 else "vFDD"
+        device_name = BOOT_DEVICE_NAMES[device]
         payload = {
             "ShareParameters":
                 {"Target": "ALL"},
@@ -374,6 +750,9 @@ class Idrac:
             "/Bios",
             xpath="Attributes"
         )
+        if all_attributes is None:
+            return None
+        self._remember('bios', all_attributes)
         return {
             k: v for k, v in all_attributes.items()
             if not pattern or re.search(pattern, k, flags=re.I)
@@ -390,30 +769,52 @@ class Idrac:
             print(f" with pattern=`{pattern}`")
         else:
             print()
-        data = self.get_bios_attributes(pattern)
+        data = self.get_bios_attributes(pattern) or {}
         margin = max(map(len, data.keys()), default=0)
         for k, v in data.items():
             print(f"{k:>{margin}}: {v}")
 
 
+    def get_bios_registry(self) -> dict:
+        """
+        the BIOS registry entries, indexed by lowercase attribute name;
+        fetched once, as it has several hundreds of entries
+        """
+        if self.bios_registry is None:
+            registry = self._get(
+                "Bios/BiosRegistry",
+                xpath="RegistryEntries.Attributes"
+            )
+            if registry is None:
+                logging.error("Could not retrieve the BIOS registry")
+                return None
+            self.bios_registry = {D['AttributeName'].lower(): D for D in registry}
+        return self.bios_registry
+
     def set_bios_attributes(self, new_values: dict) -> bool:
         """
         Parameters:
           - a dictionary that has the values to be changed
             e.g. {'MemTest': 'Disabled'}
         """
+        return self.schedule_bios_attributes(new_values) is not None
+
+    def check_bios_values(self, new_values: dict) -> dict:
+        """
+        check new_values against the BIOS registry
+
+        returns them spelled as in the registry, and converted to the
+        right type; or None if any of them is invalid
+        """
         # minimal type checking: the registry
         # explains the available settings, with some
         # details about their type and admissible value
-        registry = self._get(
-            "Bios/BiosRegistry",
-            xpath="RegistryEntries.Attributes"
-        )
+        registry = self.get_bios_registry()
+        if registry is None:
+            return None
         logging.info("BIOS registry retrieved (for type conversion and values checking)")
         def find_in_registry(setting):
-            for D in registry:
-                if D['AttributeName'].lower() == setting.lower():
-                    return D
+            return registry.get(setting.lower())
         def find_in_enumeration(value, enumeration):
             for item in enumeration:
                 if value.lower() == item.lower():
@@ -425,7 +826,7 @@ class Idrac:
             spec = find_in_registry(setting)
             if not spec:
                 logging.error(f"Unknown setting {setting} - exiting")
-                return False
+                return None
             if spec['Type'] == 'Integer':
                 new_value = int(value)
             elif spec['Type'] == 'Enumeration':
@@ -434,14 +835,23 @@ class Idrac:
                 if not new_value:
                     logging.error(f"Unexpected value {value} for setting {setting}")
                     logging.error(f"should be among {admissible}")
-                    return False
+                    return None
             else:
                 new_value = value
             new_values_checked[spec['AttributeName']] = new_value
+        return new_values_checked
 
+    def schedule_bios_attributes(self, new_values: dict) -> str:
+        """
+        same as set_bios_attributes, but returns the id of the
+        config job, or None if it could not be scheduled
+        """
+        if (new_values_checked := self.check_bios_values(new_values)) is None:
+            return None
         # create a job that tells the box to apply the settings upon next reset
         payload = {"@Redfish.SettingsApplyTime": {"ApplyTime": "OnReset"}}
         payload['Attributes'] = new_values_checked
+        self._invalidate('bios')
         response = self._post(
             "Bios/Settings",
             payload=payload,
@@ -450,9 +860,12 @@ class Idrac:
         )
         if not response:
             logging.error(f"Could not create config job")
-            return False
+            return None
         # wait for a confirmation that the config job was created allright
         task_uri = response.task_location
+        if not task_uri:
+            logging.error("Config job has no task location")
+            return None
         task_id = task_uri.split('/')[-1]
         logging.info(f"waiting for job {task_id} to be successfully scheduled")
         try:
@@ -465,42 +878,197 @@ class Idrac:
                     if not response:
                         raise ValueError(f"unexpected return code while waiting for a task")
                     if response['Message'] == 'Task successfully scheduled.':
-                        return True
+                        return task_id
                     waitloop.tick()
         except TimeoutError:
             logging.error("Config job not confirmed...")
-            return False
+            return None
 
 
     def bios_reset(self) -> OptResponse:
+        self._invalidate('bios')
         return self._post(
             "Bios/Actions/Bios.ResetBios",
             payload={},
             ok_codes=(200,),
         )
 
+    def plan_bios(self, new_values: dict, reset=False) -> dict:
+        """
+        the subset of new_values that is not already in place;
+        when combined with a reset, all of them are needed
+        returns None if the current settings cannot be read
+        """
+        if reset:
+            return dict(new_values)
+        current = self.get_bios_attributes()
+        if current is None:
+            return None
+        current = {k.lower(): str(v).lower() for k, v in current.items()}
+        return {
+            setting: value for setting, value in new_values.items()
+            if current.get(setting.lower()) != str(value).lower()
+        }
+
+    def plan_bios_reset(self, keep=()) -> dict:
+        """
+        what a BIOS reset is expected to change, i.e. the writable attributes
+        that are not currently at their registry default; the ones in keep
+        - typically set right after the reset - are left out
 
-    def get_queue(self):
-        return self._get(
-            "Jobs?$expand=*($levels=1)",
-            prefix="Managers/iDRAC.Embedded.1/",
-            xpath="Members",
-        )
+        returns a dict attribute -> default value, or None if anything goes wrong
+        """
+        registry = self.get_bios_registry()
+        current = self.get_bios_attributes()
+        if registry is None or current is None:
+            return None
+        keep = {setting.lower() for setting in keep}
+        expected = {}
+        for name, value in current.items():
+            spec = registry.get(name.lower())
+            if (not spec or name.lower() in keep or spec.get('ReadOnly')
+                    or spec.get('DefaultValue') is None):
+                continue
+            if str(value).lower() != str(spec['DefaultValue']).lower():
+                expected[name] = spec['DefaultValue']
+        return expected
+
+    def check_bios(self, expected: dict, verbose=True) -> bool:
+        """
+        whether the BIOS settings match expected
+        """
+        changes = self.plan_bios(expected)
+        if changes is None:
+            return False
+        if verbose:
+            for setting, value in changes.items():
+                logging.error(f"{self}: {setting} is not set to {value}")
+        return not changes
+
+
+    def get_expand_max_levels(self) -> int:
+        """
+        how deep the firmware accepts to $expand, as advertised in the service root
+        """
+        return jmespath.search(
+            "ExpandQuery.MaxLevels", self.get_query_features()) or 1
+
+    def get_inventory(self) -> dict[str, list[dict]]:
+        """
+        returns a dict with one key per kind of component, i.e.
+        'system', 'processor', 'memory', 'nic' and 'firmware'
+        each associated with a list of compact dicts, see INVENTORY_XPATHS
+
+        if the firmware supports it, the system and its collections are
+        fetched in a single request; otherwise it takes one request
+        for the system, and one for each collection
+        returns None if anything goes wrong
+        """
+        raw = {}
+        if self.get_expand_max_levels() >= 2:
+            system = self._get(
+                "System.Embedded.1?$expand=.($levels=2)", prefix="Systems/")
+            if system is None:
+                return None
+            for kind, collection in INVENTORY_COLLECTIONS.items():
+                members = jmespath.search(f"{collection}.Members", system)
+                # make sure the expansion has actually taken place
+                if members and all('Id' in member for member in members):
+                    raw[kind] = members
+        else:
+            system = self._get("", prefix="Systems/System.Embedded.1")
+            if system is None:
+                return None
+        raw['system'] = [system]
+        for kind, collection in INVENTORY_COLLECTIONS.items():
+            if kind in raw:
+                continue
+            raw[kind] = self.get_members(collection)
+        raw['firmware'] = self.get_members(
+            "FirmwareInventory", prefix="UpdateService/",
+            select=("Id", "Name", "Version"))
+        if any(members is None for members in raw.values()):
+            return None
+        def compact(kind, member):
+            return {k: v for k, v in jmespath.search(INVENTORY_XPATHS[kind], member).items()
+                    if v is not None}
+        return {
+            kind: [compact(kind, member) for member in members]
+            for kind, members in raw.items()
+        }
+
+
+    # what we use from the jobs
+    JOB_PROPERTIES = ("Id", "Name", "JobType", "JobState", "PercentComplete")
+
+    def iter_queue(self, incomplete=False):
+        """
+        a generator over the jobs, see iter_members;
+        with incomplete=True, the (usually many) completed jobs
+        get filtered out, on the box side if it supports it
+        """
+        return self.iter_members(
+            "Jobs", prefix="Managers/iDRAC.Embedded.1/",
+            select=self.JOB_PROPERTIES,
+            odata_filter="PercentComplete lt 100" if incomplete else None,
+            predicate=(lambda job: job['PercentComplete'] != 100) if incomplete else None)
+
+    def get_queue(self, incomplete=False):
+        try:
+            return list(self.iter_queue(incomplete))
+        except RuntimeError as exc:
+            logging.error(exc)
+            return None
 
     def show_queue(self, show_all=False):
         def oneliner(job):
             return f"complete {job['PercentComplete']:3}% {job['Name']} - {job['JobType']} ({job['Id']})"
-        # show past jobs if requested
-        if show_all:
-            print(f"{' Past jobs ':-^60}")
-            for job in self.get_queue():
-                if job['PercentComplete'] == 100:
-                    print(oneliner(job))
-        # the others
+        # a single pass over the queue; only the current jobs are kept
+        # in memory, for being displayed after the past ones
+        current = []
+        try:
+            if show_all:
+                print(f"{' Past jobs ':-^60}")
+                for job in self.iter_queue():
+                    if job['PercentComplete'] == 100:
+                        print(oneliner(job))
+                    else:
+                        current.append(job)
+            else:
+                current = self.get_queue(incomplete=True) or []
+        except RuntimeError as exc:
+            logging.error(exc)
         print(f"{' Current jobs ':-^60}")
-        for job in self.get_queue():
-            if job['PercentComplete'] != 100:
-                print(oneliner(job))
+        for job in current:
+            print(oneliner(job))
+
+    def get_job(self, job_id) -> dict:
+        return self._get(
+            f"Jobs/{job_id}", prefix="Managers/iDRAC.Embedded.1/")
+
+    def wait_for_jobs(self, job_ids, timeout=900, check_cycle=10) -> dict:
+        """
+        wait for these jobs to complete - typically during the POST
+        that follows a power cycle
+
+        returns a dict job_id -> JobState, the last ones seen on timeout
+        """
+        states = {job_id: None for job_id in job_ids}
+        try:
+            with WaitLoop(timeout=timeout, period=check_cycle) as waitloop:
+                while True:
+                    for job_id in states:
+                        if (job := self.get_job(job_id)) is not None:
+                            states[job_id] = job['JobState']
+                            logging.info(f"{self}: job {job_id} is {job['JobState']}"
+                                         f" - {job['PercentComplete']}%")
+                    if all(state in ('Completed', 'Failed', 'CompletedWithErrors')
+                           for state in states.values()):
+                        return states
+                    waitloop.tick()
+        except TimeoutError:
+            logging.error(f"{self}: jobs not complete after {timeout}s")
+            return states
 
     def clear_queue(self, job_id=None):
         payload = dict(JobID = str(job_id) if job_id else "JID_CLEARALL")
@@ -0,0 +1,149 @@
+# pylint: disable=missing-function-docstring
+# pylint: disable=logging-fstring-interpolation
+
+"""
+a local store for the hardware inventory of the nodes
+
+the inventory, as returned by Idrac.get_inventory(), is stored in a
+sqlite database, with one row per component; each node also has a
+fingerprint of its inventory, so that a refresh only rewrites the
+nodes whose inventory has changed
+
+the data column is JSON, so it can be queried directly, e.g.
+
+    sqlite3 inventory.sqlite \\
+      "SELECT stem, json_extract(data, '$.Version') FROM components
+       WHERE kind = 'firmware' AND json_extract(data, '$.Name') LIKE '%BIOS%'"
+"""
+
+import re
+import json
+import time
+import hashlib
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from .scheduler import connect_shared
+
+
+DEFAULT_DIRECTORY = "/var/lib/sopnode/liveboot"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    stem TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    collected REAL,
+    changed REAL
+);
+CREATE TABLE IF NOT EXISTS components (
+    stem TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (stem, kind, id)
+);
+"""
+
+
+def fingerprint(inventory: dict) -> str:
+    canonical = json.dumps(inventory, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+@dataclass
+class InventoryStore:
+    directory: str = DEFAULT_DIRECTORY
+
+    def __repr__(self):
+        return f"InventoryStore {self.directory}"
+
+    @staticmethod
+    def from_config(config) -> "InventoryStore":
+        """
+        build from the optional 'inventory' section in the config
+        """
+        inventory_config = config.get('inventory', {})
+        return InventoryStore(
+            directory=inventory_config.get('directory', DEFAULT_DIRECTORY),
+        )
+
+
+    @contextmanager
+    def _database(self):
+        connection = connect_shared(self.directory, "inventory.sqlite", timeout=30)
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+    def update(self, stem, inventory: dict) -> bool:
+        """
+        store the inventory for that node, unless it has not changed
+
+        returns True if the store was actually changed
+        """
+        now = time.time()
+        new_fingerprint = fingerprint(inventory)
+        with self._database() as db:
+            row = db.execute(
+                "SELECT fingerprint FROM nodes WHERE stem = ?", (stem,)).fetchone()
+            if row and row[0] == new_fingerprint:
+                db.execute(
+                    "UPDATE nodes SET collected = ? WHERE stem = ?", (now, stem))
+                return False
+            logging.info(f"inventory of {stem} has changed")
+            db.execute("DELETE FROM components WHERE stem = ?", (stem,))
+            db.executemany(
+                "INSERT INTO components (stem, kind, id, data) VALUES (?, ?, ?, ?)",
+                [(stem, kind, component.get('Id') or str(index),
+                  json.dumps(component, separators=(',', ':')))
+                 for kind, components in inventory.items()
+                 for index, component in enumerate(components)])
+            db.execute(
+                "INSERT OR REPLACE INTO nodes (stem, fingerprint, collected, changed)"
+                " VALUES (?, ?, ?, ?)",
+                (stem, new_fingerprint, now, now))
+            return True
+
+
+    def query(self, stems=None, kind=None, pattern=None) -> list[tuple]:
+        """
+        returns a list of (stem, kind, id, data) tuples
+
+        Parameters:
+          - stems: restrict to these nodes
+          - kind: restrict to that kind of component, e.g. 'memory'
+          - pattern: a regexp; only the fields whose name or value
+            matches are kept, and the components that have none are skipped
+        """
+        sql = "SELECT stem, kind, id, data FROM components"
+        conditions, params = [], []
+        if stems:
+            conditions.append(f"stem IN ({', '.join('?' for _ in stems)})")
+            params.extend(stems)
+        if kind:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY stem, kind, id"
+        result = []
+        with self._database() as db:
+            for stem, kind_, id_, data in db.execute(sql, params):
+                data = json.loads(data)
+                if pattern:
+                    data = {k: v for k, v in data.items()
+                            if re.search(pattern, f"{k}={v}", flags=re.I)}
+                    if not data:
+                        continue
+                result.append((stem, kind_, id_, data))
+        return result
+
+    def show(self, stems=None, kind=None, pattern=None) -> None:
+        for stem, kind_, id_, data in self.query(stems, kind, pattern):
+            fields = " ".join(f"{k}={v}" for k, v in data.items() if k != 'Id')
+            print(f"{stem} {kind_:>9} {id_}: {fields}")
@@ -0,0 +1,130 @@
+# pylint: disable=missing-function-docstring
+# pylint: disable=logging-fstring-interpolation
+
+"""
+run a set of tasks as a dependency graph
+
+each task is started as soon as all its dependencies are done, so that
+independent tasks run concurrently, in threads; a task fails if it
+raises an exception, or if it returns False (None is fine); in that case
+the tasks that depend on it are skipped
+
+    pipeline = Pipeline("liveboot")
+    pipeline.add("login", idrac.login)
+    pipeline.add("seed", build_seed)
+    pipeline.add("medias", set_medias, depends=("login", "seed"))
+    if not pipeline.run():
+        ...
+    pipeline.show_timings()
+"""
+
+import time
+import logging
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+@dataclass
+class Task:
+    name: str
+    function: callable
+    depends: tuple = ()
+    # pending, running, done, failed or skipped
+    state: str = 'pending'
+    result: object = None
+    begin: float = None
+    end: float = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.begin if self.end is not None else 0.
+
+
+class Pipeline:
+
+    def __init__(self, name):
+        self.name = name
+        self.tasks = {}
+        self.begin = None
+        self.end = None
+
+    def __repr__(self):
+        return f"Pipeline {self.name}"
+
+    def add(self, name, function, depends=()) -> None:
+        for dependency in depends:
+            if dependency not in self.tasks:
+                raise ValueError(f"{self}: {name} depends on unknown task {dependency}")
+        self.tasks[name] = Task(name, function, tuple(depends))
+
+    def result(self, name):
+        return self.tasks[name].result
+
+
+    def _run_task(self, task):
+        task.begin = time.perf_counter() - self.begin
+        try:
+            task.result = task.function()
+        except Exception as exc:                        # pylint: disable=broad-except
+            logging.error(f"{self}: task {task.name} raised {type(exc).__name__} {exc}")
+            task.result = False
+        task.end = time.perf_counter() - self.begin
+        return task
+
+    def run(self) -> bool:
+        """
+        returns True if all tasks are done
+        """
+        self.begin = time.perf_counter()
+        running = {}
+        with ThreadPoolExecutor(max_workers=len(self.tasks) or 1) as executor:
+            while True:
+                # tasks are added after their dependencies, so
+                # one pass is enough to propagate the skipped state
+                for task in self.tasks.values():
+                    if task.state != 'pending':
+                        continue
+                    states = {self.tasks[d].state for d in task.depends}
+                    if states & {'failed', 'skipped'}:
+                        logging.info(f"{self}: skipping task {task.name}")
+                        task.state = 'skipped'
+                    elif states <= {'done'}:
+                        task.state = 'running'
+                        running[executor.submit(self._run_task, task)] = task
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    task.state = 'failed' if task.result is False else 'done'
+        self.end = time.perf_counter() - self.begin
+        return all(task.state == 'done' for task in self.tasks.values())
+
+
+    def critical_path(self) -> tuple[list[str], float]:
+        """
+        the chain of dependencies that takes the longest, and its duration
+        """
+        # tasks are added after their dependencies
+        longest = {}
+        for task in self.tasks.values():
+            before, path = max(
+                (longest[d] for d in task.depends), default=(0., []))
+            longest[task.name] = (before + task.duration, path + [task.name])
+        duration, path = max(longest.values(), default=(0., []))
+        return path, duration
+
+    def show_timings(self) -> None:
+        margin = max(map(len, self.tasks), default=0)
+        for task in self.tasks.values():
+            if task.begin is None:
+                logging.info(f"{task.name:>{margin}}: {task.state}")
+                continue
+            logging.info(f"{task.name:>{margin}}: {task.state}"
+                         f" from {task.begin:6.2f}s to {task.end:6.2f}s"
+                         f" ({task.duration:.2f}s)")
+        sequential = sum(task.duration for task in self.tasks.values())
+        path, duration = self.critical_path()
+        logging.info(f"{self}: took {self.end:.2f}s"
+                     f" - would take {sequential:.2f}s if run sequentially")
+        logging.info(f"{self}: critical path {' > '.join(path)} ({duration:.2f}s)")
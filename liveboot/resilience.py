@@ -0,0 +1,137 @@
+# pylint: disable=missing-function-docstring
+# pylint: disable=logging-fstring-interpolation
+
+"""
+keep the tail latency under control when talking to the iDRACs
+
+* RetryPolicy: connect and read timeouts, and how to retry
+  the idempotent requests, with an exponential backoff
+* CircuitBreaker: after a few consecutive failed requests,
+  a BMC is considered down, and the requests to it fail fast
+  for a while instead of waiting for their timeouts; the state
+  is kept in the node cache, so that it survives across runs
+"""
+
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from .cache import NodeStateCache
+
+
+class BmcUnavailable(RuntimeError):
+    """
+    the BMC could not be reached, or is known to be down
+    """
+
+
+@dataclass
+class RetryPolicy:
+    # in seconds
+    connect_timeout: float = 5
+    read_timeout: float = 60
+    # how many times an idempotent request gets retried
+    retries: int = 2
+    # the delay before the first retry, then doubled each time
+    backoff: float = 1
+    max_backoff: float = 30
+
+    @staticmethod
+    def from_config(config) -> "RetryPolicy":
+        """
+        build from the optional 'redfish' section in the config
+        """
+        redfish_config = config.get('redfish', {})
+        return RetryPolicy(
+            connect_timeout=redfish_config.get('connect-timeout', 5),
+            read_timeout=redfish_config.get('read-timeout', 60),
+            retries=redfish_config.get('retries', 2),
+            backoff=redfish_config.get('backoff', 1),
+        )
+
+    @property
+    def timeout(self) -> tuple:
+        """
+        as expected by requests
+        """
+        return (self.connect_timeout, self.read_timeout)
+
+    def delay(self, attempt) -> float:
+        """
+        how long to wait after that attempt (0-based) has failed
+        """
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+
+@dataclass
+class CircuitBreaker:
+    # typically the BMC address
+    key: str
+    # that many consecutive failures open the circuit
+    threshold: int = 3
+    # how long the circuit remains open, in seconds
+    cooldown: float = 300
+    # optional, to share the state with other processes
+    cache: NodeStateCache = None
+    failures: int = 0
+    open_until: float = 0
+    # the tasks of a pipeline share the breaker
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.cache:
+            hit = self.cache.get(self.key, 'health', max_age=float('inf'))
+            if hit:
+                state, _ = hit
+                self.failures = state['failures']
+                self.open_until = state['open_until']
+
+    @staticmethod
+    def from_config(config, key, cache=None) -> "CircuitBreaker":
+        redfish_config = config.get('redfish', {})
+        return CircuitBreaker(
+            key, cache=cache,
+            threshold=redfish_config.get('failure-threshold', 3),
+            cooldown=redfish_config.get('cooldown', 300),
+        )
+
+    def _save(self):
+        if self.cache:
+            self.cache.put(self.key, 'health',
+                           {'failures': self.failures, 'open_until': self.open_until})
+
+    def check(self) -> None:
+        """
+        raises BmcUnavailable if the circuit is open;
+        once the cooldown has expired, requests are let through again,
+        and the first one decides whether the circuit gets closed
+        """
+        if (remaining := self.open_until - time.time()) > 0:
+            raise BmcUnavailable(
+                f"{self.key} is considered down, for another {remaining:.0f}s")
+
+    def success(self) -> None:
+        with self.lock:
+            if self.failures or self.open_until:
+                self.failures, self.open_until = 0, 0
+                self._save()
+
+    def failure(self) -> None:
+        """
+        to be called once per failed request, i.e. after its retries
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                logging.warning(f"{self.key}: {self.failures} consecutive failures,"
+                                f" considered down for {self.cooldown}s")
+                self.open_until = time.time() + self.cooldown
+            self._save()
+
+    def health(self) -> str:
+        if (remaining := self.open_until - time.time()) > 0:
+            return f"down (retry in {remaining:.0f}s)"
+        if self.failures:
+            return f"degraded ({self.failures} consecutive failures)"
+        return "healthy"
@@ -0,0 +1,362 @@
+# pylint: disable=missing-function-docstring
+# pylint: disable=logging-fstring-interpolation
+
+"""
+a local scheduler for the operations that act on the nodes
+
+* all operations get recorded in a persistent queue - a sqlite database -
+  so that several users, each running their own liveboot process, can see
+  each other's work
+* each node can be leased by only one operation at a time; others wait for
+  their turn, in the order of their priority, then of their submission
+* the operations that make the iDRAC pull an ISO image (i.e. liveboot) are
+  also subject to a global limit, so that the bandwidth of the image server
+  gets shared predictably; because the ISO is actually pulled while the node
+  boots, that is after the liveboot command has returned, such an operation
+  keeps its bandwidth slot for an additional `boot-hold` seconds
+"""
+
+import os
+import time
+import signal
+import socket
+import getpass
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime as DateTime
+
+from .waitloop import WaitLoop
+
+
+DEFAULT_DIRECTORY = "/var/lib/sopnode/liveboot"
+
+# jobs in these states are still alive
+ACTIVE_STATES = ('pending', 'running')
+
+# finished jobs are forgotten after that time, in seconds
+HISTORY = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stem TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    bandwidth INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    user TEXT,
+    host TEXT,
+    pid INTEGER,
+    submitted REAL,
+    started REAL,
+    finished REAL
+)
+"""
+
+
+def connect_shared(directory, filename, **kwargs) -> sqlite3.Connection:
+    """
+    open a sqlite database that several users share
+
+    the directory gets created setgid and group-writable, so that the
+    files in there belong to its group; and the database gets created
+    group-writable - sqlite then gives its journal the same permissions
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+        os.chmod(directory, 0o2775)
+    path = f"{directory}/{filename}"
+    created = not os.path.exists(path)
+    connection = sqlite3.connect(path, **kwargs)
+    if created:
+        os.chmod(path, 0o664)
+    return connection
+
+
+class JobCancelled(Exception):
+    """
+    raised in the process of a job that gets cancelled, either
+    while it waits for its lease, or while it runs (upon SIGTERM)
+    """
+
+
+class NotScheduled(Exception):
+    """
+    raised by lease() when the job could not get its lease
+    """
+
+
+def _pid_is_alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, but belongs to someone else
+        return True
+    return True
+
+
+@dataclass
+class Scheduler:
+    directory: str = DEFAULT_DIRECTORY
+    # how many liveboots can be in progress at the same time
+    max_boots: int = 4
+    # how long a liveboot keeps its bandwidth slot after it has returned
+    boot_hold: int = 120
+    # how often a waiting job checks if its turn has come
+    period: int = 2
+    # how long a job accepts to wait for its turn
+    timeout: int = 3600
+
+    def __repr__(self):
+        return f"Scheduler {self.directory}"
+
+    @staticmethod
+    def from_config(config) -> "Scheduler":
+        """
+        build from the optional 'scheduler' section in the config
+        """
+        sched_config = config.get('scheduler', {})
+        return Scheduler(
+            directory=sched_config.get('directory', DEFAULT_DIRECTORY),
+            max_boots=sched_config.get('max-concurrent-boots', 4),
+            boot_hold=sched_config.get('boot-hold', 120),
+        )
+
+
+    @contextmanager
+    def _database(self):
+        """
+        a connection in autocommit mode; use BEGIN IMMEDIATE explicitly
+        for the read-then-write sequences
+        """
+        connection = connect_shared(
+            self.directory, "jobs.sqlite", timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute(SCHEMA)
+            yield connection
+        finally:
+            connection.close()
+
+
+    def _reap(self, db) -> None:
+        """
+        mark as abandoned the active jobs whose process has gone away
+        (only possible for the jobs that run on this host)
+        and forget about old finished jobs
+        """
+        now = time.time()
+        host = socket.gethostname()
+        for job in db.execute(
+                "SELECT id, pid FROM jobs WHERE host = ? AND state IN (?, ?)",
+                (host, *ACTIVE_STATES)):
+            if not _pid_is_alive(job['pid']):
+                logging.warning(f"scheduler: job {job['id']} has vanished")
+                db.execute(
+                    "UPDATE jobs SET state = 'abandoned', finished = ? WHERE id = ?",
+                    (now, job['id']))
+        db.execute(
+            "DELETE FROM jobs WHERE state NOT IN (?, ?) AND finished < ?",
+            (*ACTIVE_STATES, now - HISTORY))
+
+
+    def submit(self, stem, operation, priority=0, bandwidth=False) -> int:
+        """
+        record a new pending job, returns its id
+        """
+        with self._database() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (stem, operation, priority, bandwidth, state,"
+                " user, host, pid, submitted)"
+                " VALUES (?, ?, ?, ?, 'pending', ?, ?, ?, ?)",
+                (stem, operation, priority, int(bandwidth),
+                 getpass.getuser(), socket.gethostname(), os.getpid(), time.time()))
+            return cursor.lastrowid
+
+
+    def _try_start(self, job_id) -> bool:
+        """
+        atomically check if the job can start, and if so mark it running
+
+        raises JobCancelled if the job is no longer pending
+        """
+        now = time.time()
+        with self._database() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._reap(db)
+                job = db.execute(
+                    "SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if job is None or job['state'] != 'pending':
+                    raise JobCancelled(
+                        f"job {job_id} is {job['state'] if job else 'gone'}")
+                # somebody is already working on that node
+                if db.execute(
+                        "SELECT 1 FROM jobs WHERE stem = ? AND state = 'running'",
+                        (job['stem'],)).fetchone():
+                    return False
+                # a pending job should go first on that node
+                ahead = ("(priority > :priority"
+                         " OR (priority = :priority AND id < :id))")
+                if db.execute(
+                        f"SELECT 1 FROM jobs WHERE state = 'pending'"
+                        f" AND stem = :stem AND {ahead}",
+                        dict(job)).fetchone():
+                    return False
+                if job['bandwidth']:
+                    # a pending image-hungry job should go first,
+                    # unless it cannot start anyway because its node is busy
+                    if db.execute(
+                            f"SELECT 1 FROM jobs AS other WHERE state = 'pending'"
+                            f" AND bandwidth = 1 AND {ahead}"
+                            f" AND NOT EXISTS (SELECT 1 FROM jobs WHERE"
+                            f" stem = other.stem AND state = 'running')",
+                            dict(job)).fetchone():
+                        return False
+                    busy, = db.execute(
+                        "SELECT COUNT(*) FROM jobs WHERE bandwidth = 1"
+                        " AND started IS NOT NULL"
+                        " AND (state = 'running' OR finished > ?)",
+                        (now - self.boot_hold,)).fetchone()
+                    if busy >= self.max_boots:
+                        return False
+                db.execute(
+                    "UPDATE jobs SET state = 'running', started = ? WHERE id = ?",
+                    (now, job_id))
+                return True
+            finally:
+                db.execute("COMMIT")
+
+
+    def _finish(self, job_id, state) -> None:
+        with self._database() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, finished = ?"
+                " WHERE id = ? AND state IN (?, ?)",
+                (state, time.time(), job_id, *ACTIVE_STATES))
+
+
+    @contextmanager
+    def lease(self, stem, operation, priority=0, bandwidth=False):
+        """
+        submit a job, wait for its turn, and yield its id
+        while the caller holds the lease on that node
+
+        Parameters:
+          - priority: higher priorities get served first
+          - bandwidth: set this for operations that make
+            the iDRAC pull an image from the image server
+
+        Raises:
+          - NotScheduled if the job does not get its lease, i.e. if it gets
+            cancelled while waiting, if its turn does not come within
+            self.timeout, or if the scheduler database is not usable
+          - JobCancelled, from within the body, if the job gets cancelled
+            while it runs; a SIGTERM handler is installed for that purpose
+            (in the main thread only), so that the caller can clean up
+        """
+        announced = False
+        job_id = None
+        try:
+            job_id = self.submit(stem, operation, priority, bandwidth)
+            with WaitLoop(timeout=self.timeout, period=self.period) as waitloop:
+                while not self._try_start(job_id):
+                    if not announced:
+                        logging.info(f"scheduler: job {job_id} ({operation} {stem})"
+                                     f" is waiting for its turn")
+                        announced = True
+                    waitloop.tick()
+        except TimeoutError as exc:
+            self._finish(job_id, 'timedout')
+            raise NotScheduled(f"job {job_id}: {exc}") from exc
+        except JobCancelled as exc:
+            raise NotScheduled(str(exc)) from exc
+        except sqlite3.Error as exc:
+            raise NotScheduled(f"{self} is not usable: {exc}") from exc
+        except KeyboardInterrupt:
+            if job_id is not None:
+                self._finish(job_id, 'cancelled')
+            raise
+        if announced:
+            logging.info(f"scheduler: job {job_id} is starting")
+        def terminated(signum, frame):
+            raise JobCancelled(f"job {job_id} was cancelled")
+        previous = None
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.signal(signal.SIGTERM, terminated)
+        try:
+            yield job_id
+        except BaseException:
+            self._finish(job_id, 'failed')
+            raise
+        finally:
+            if previous is not None:
+                signal.signal(signal.SIGTERM, previous)
+        self._finish(job_id, 'done')
+
+
+    def cancel(self, job_id) -> bool:
+        """
+        a pending job gets removed from the queue;
+        a running job gets its process terminated (if it runs on this host)
+        """
+        with self._database() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                job = db.execute(
+                    "SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if job is None or job['state'] not in ACTIVE_STATES:
+                    logging.error(f"scheduler: no active job {job_id}")
+                    return False
+                if job['state'] == 'running':
+                    if job['host'] != socket.gethostname():
+                        logging.error(f"scheduler: job {job_id} runs on {job['host']}")
+                        return False
+                    try:
+                        os.kill(job['pid'], signal.SIGTERM)
+                    except ProcessLookupError:
+                        pass
+                db.execute(
+                    "UPDATE jobs SET state = 'cancelled', finished = ? WHERE id = ?",
+                    (time.time(), job_id))
+                return True
+            finally:
+                db.execute("COMMIT")
+
+
+    def get_jobs(self, show_all=False) -> list[dict]:
+        with self._database() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._reap(db)
+            finally:
+                db.execute("COMMIT")
+            query = "SELECT * FROM jobs"
+            if not show_all:
+                query += f" WHERE state IN {ACTIVE_STATES}"
+            query += " ORDER BY id"
+            return [dict(row) for row in db.execute(query)]
+
+    def show_jobs(self, show_all=False) -> None:
+        def timestamp(epoch):
+            if not epoch:
+                return 8 * '-'
+            return DateTime.fromtimestamp(epoch).strftime("%H:%M:%S")
+        def oneliner(job):
+            return (f"{job['id']:>5} {job['state']:>9} prio={job['priority']:<3}"
+                    f" {job['operation']:>10} {job['stem']:<6}"
+                    f" {job['user']}@{job['host']}"
+                    f" submitted {timestamp(job['submitted'])}"
+                    f" started {timestamp(job['started'])}"
+                    f" finished {timestamp(job['finished'])}")
+        jobs = self.get_jobs(show_all)
+        if not jobs:
+            print("no job")
+            return
+        for job in jobs:
+            print(oneliner(job))
@@ -0,0 +1,149 @@
+# pylint: disable=missing-function-docstring
+
+"""
+a pooled HTTPS transport, one per BMC, shared within the process
+
+iDRAC TLS handshakes are slow, so we want to avoid them as much as possible:
+
+* connections are kept alive and pooled, and the pool survives the
+  logout of the redfish client, so that all operations on a given node
+  within the process share the same connections
+* when a new connection is needed anyway, the TLS session of the previous
+  one is offered to the server, so that it can resume it instead of
+  going through a full handshake; with TLS 1.3 the session ticket only
+  arrives after the handshake, so the session gets saved once a response
+  has been received on the connection
+
+the adapter also keeps counters, about how many requests went through a
+new connection - i.e. paid for a handshake - or a reused one, and
+how long these took on average
+"""
+
+import ssl
+import time
+import threading
+
+from requests.adapters import HTTPAdapter
+
+
+class ResumingContext(ssl.SSLContext):
+    """
+    an SSL context that offers the last TLS session it has seen with a
+    given peer, when opening a new connection to that peer
+    """
+
+    def __new__(cls, *args, **kwargs):
+        context = super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+        # iDRACs come with self-signed certificates, and
+        # the redfish library does not verify them anyway
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        context.sessions = {}
+        context.handshakes = 0
+        context.resumed = 0
+        context.lock = threading.Lock()
+        return context
+
+    def wrap_socket(self, sock, *args, **kwargs):               # pylint: disable=arguments-differ
+        peer = sock.getpeername()[:2]
+        with self.lock:
+            session = self.sessions.get(peer)
+        sslsock = super().wrap_socket(sock, *args, session=session, **kwargs)
+        with self.lock:
+            self.handshakes += 1
+            if sslsock.session_reused:
+                self.resumed += 1
+        return sslsock
+
+    def remember(self, sslsock) -> None:
+        """
+        save the session of that socket, for the next connection to its peer;
+        to be called once a response has been read on that socket
+        """
+        try:
+            peer = sslsock.getpeername()[:2]
+            session = sslsock.session
+        except (OSError, AttributeError):
+            return
+        if session is not None:
+            with self.lock:
+                self.sessions[peer] = session
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    keep-alive, TLS session resumption, and counters
+    """
+
+    def __init__(self, key, pool_maxsize=4):
+        self.key = key
+        self.context = ResumingContext()
+        self.requests = 0
+        self.fresh = 0
+        self.fresh_elapsed = 0.
+        self.reused_elapsed = 0.
+        self.lock = threading.Lock()
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize)
+
+    def __repr__(self):
+        return f"PooledAdapter {self.key}"
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):                   # pylint: disable=arguments-differ
+        handshakes = self.context.handshakes
+        begin = time.perf_counter()
+        response = super().send(request, *args, **kwargs)
+        elapsed = time.perf_counter() - begin
+        # the response headers have been read, and so has any TLS 1.3 ticket
+        connection = getattr(response.raw, 'connection', None)
+        if isinstance(sock := getattr(connection, 'sock', None), ssl.SSLSocket):
+            self.context.remember(sock)
+        with self.lock:
+            self.requests += 1
+            # approximate when several threads share the adapter
+            if self.context.handshakes != handshakes:
+                self.fresh += 1
+                self.fresh_elapsed += elapsed
+            else:
+                self.reused_elapsed += elapsed
+        return response
+
+    def close(self):
+        # the redfish client closes its session upon logout;
+        # we want to keep the connections for the next login
+        pass
+
+    def stats(self) -> dict:
+        reused = self.requests - self.fresh
+        return {
+            'requests': self.requests,
+            'handshakes': self.context.handshakes,
+            'resumed': self.context.resumed,
+            'reused': reused,
+            'fresh-latency': self.fresh_elapsed / self.fresh if self.fresh else None,
+            'reused-latency': self.reused_elapsed / reused if reused else None,
+        }
+
+    def show_stats(self) -> None:
+        stats = self.stats()
+        def ms(latency):
+            return f"{1000*latency:.0f}ms" if latency is not None else "n/a"
+        print(f"{self.key}: {stats['requests']} requests,"
+              f" {stats['handshakes']} TLS handshakes ({stats['resumed']} resumed),"
+              f" {stats['reused']} on a reused connection;"
+              f" average latency {ms(stats['fresh-latency'])} with a handshake,"
+              f" {ms(stats['reused-latency'])} without")
+
+
+# one adapter per BMC, for the whole process
+ADAPTERS = {}
+_ADAPTERS_LOCK = threading.Lock()
+
+def get_adapter(key) -> PooledAdapter:
+    with _ADAPTERS_LOCK:
+        if key not in ADAPTERS:
+            ADAPTERS[key] = PooledAdapter(key)
+        return ADAPTERS[key]
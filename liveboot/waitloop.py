@@ -14,6 +14,9 @@ class WaitLoop:
         print("the right thing did not happen within 60 s")
     """
 
+    # to sleep less than period, e.g. when replaying a cassette
+    speed = 1
+
     def __init__(self, timeout=60, period=1):
         self.period = period
         self.timeout = timeout
@@ -29,4 +32,4 @@ class WaitLoop:
         if time.time() - self.begin >= self.timeout:
             raise TimeoutError(f"waiting each {self.period} s "
                                f"for {self.timeout} s has reached timeout")
-        time.sleep(self.period)
\ No newline at end of file
+        time.sleep(self.period / self.speed)
\ No newline at end of file
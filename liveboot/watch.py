@@ -0,0 +1,186 @@
+# pylint: disable=missing-function-docstring
+# pylint: disable=logging-fstring-interpolation
+
+"""
+a live dashboard of the state of many nodes
+
+* each node keeps one session with its iDRAC during the whole watch
+* each node is polled adaptively: often while its state changes,
+  and less and less often while it remains stable
+* all the polls share a global budget of requests per second,
+  so that the iDRACs do not get overloaded
+"""
+
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from .idrac import Idrac
+from .resilience import BmcUnavailable
+
+
+# power state, virtual medias, and jobs
+REQUESTS_PER_POLL = 3
+# the service root, and the session creation
+REQUESTS_PER_LOGIN = 2
+# the first poll also fetches the ProtocolFeaturesSupported
+MAX_REQUESTS_PER_POLL = REQUESTS_PER_POLL + REQUESTS_PER_LOGIN + 1
+
+
+class TokenBucket:
+    """
+    allows `rate` tokens per second on average, and bursts of up to `burst` tokens
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens) -> bool:
+        """
+        non-blocking; returns True if the tokens could be taken
+        """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens < tokens:
+                return False
+            self.tokens -= tokens
+            return True
+
+
+@dataclass
+class NodeWatch:
+    stem: str
+    hostname: str
+    idrac: Idrac
+    min_interval: float = 5
+    max_interval: float = 120
+    interval: float = 5
+    next_poll: float = 0
+    polled: float = None
+    state: dict = None
+
+    def cost(self) -> int:
+        """
+        how many requests the next poll is going to issue
+        """
+        cost = REQUESTS_PER_POLL
+        if not self.idrac.proxy:
+            cost += REQUESTS_PER_LOGIN
+        if self.idrac.query_features is None:
+            cost += 1
+        return cost
+
+    def drop_session(self) -> None:
+        """
+        log out, best effort, so that the next poll logs in again;
+        iDRACs only accept a handful of sessions, so do not leave them behind
+        """
+        try:
+            self.idrac.logout()
+        except Exception as exc:                        # pylint: disable=broad-except
+            logging.debug(f"{self.stem}: logout failed: {exc}")
+        self.idrac.proxy = None
+
+    def poll(self) -> None:
+        state = {}
+        try:
+            if not self.idrac.proxy:
+                self.idrac.login()
+            state['power'] = self.idrac.get_power_state()
+            state['medias'] = self.idrac.get_virtual_medias_status() or {}
+            jobs = self.idrac.get_queue(incomplete=True)
+            state['jobs'] = len(jobs) if jobs is not None else '???'
+            if state['power'] is None:
+                # most likely the session has expired; log in again next time
+                self.drop_session()
+        except BmcUnavailable as exc:
+            logging.debug(exc)
+            state['power'] = self.idrac.breaker.health()
+        except Exception as exc:                        # pylint: disable=broad-except
+            state['power'] = f"{type(exc).__name__}"
+            self.drop_session()
+        state['ssh'] = os.system(
+            f"nc --wait 0.5 {self.hostname} 22 < /dev/null >& /dev/null") == 0
+        # poll again soon if anything has changed
+        if state != self.state:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(2 * self.interval, self.max_interval)
+        self.state = state
+        self.polled = time.time()
+        self.next_poll = self.polled + self.interval
+
+    def row(self, now) -> list[str]:
+        if self.state is None:
+            return [self.stem, "..."]
+        def image(url):
+            return Path(url).name if url else '-'
+        medias = [image(url) for _, url in sorted(self.state.get('medias', {}).items())]
+        return [
+            self.stem,
+            self.state['power'] or '???',
+            *(medias or ['-', '-']),
+            str(self.state.get('jobs', '-')),
+            'OK' if self.state['ssh'] else 'KO',
+            f"{now - self.polled:.0f}s ago",
+            f"every {self.interval:.0f}s",
+        ]
+
+
+def render(watches, bucket, requests) -> None:
+    now = time.time()
+    header = ["node", "power", "slot 1", "slot 2", "jobs", "SSH", "polled", "next"]
+    rows = [header] + [watch.row(now) for watch in watches]
+    widths = [max(len(row[i]) for row in rows if i < len(row))
+              for i in range(len(header))]
+    # clear screen and go home
+    print("\033[H\033[J", end="")
+    for row in rows:
+        print("  ".join(f"{cell:<{width}}" for cell, width in zip(row, widths)))
+    print()
+    print(f"budget {bucket.rate} requests/s - {requests} requests so far"
+          f" - {time.strftime('%H:%M:%S')} - Ctrl-C to exit")
+
+
+def watch(watches: list[NodeWatch], budget=2., refresh=1.) -> None:
+    """
+    poll the nodes until interrupted, within the budget of requests per second
+    """
+    bucket = TokenBucket(budget, burst=max(budget, MAX_REQUESTS_PER_POLL))
+    requests = 0
+    inflight = {}
+    try:
+        # upon Ctrl-C, leaving the executor waits for the polls in flight
+        with ThreadPoolExecutor(max_workers=len(watches)) as executor:
+            while True:
+                now = time.time()
+                for node in sorted(watches, key=lambda w: w.next_poll):
+                    if node.next_poll > now:
+                        break
+                    if node.stem in inflight:
+                        continue
+                    cost = node.cost()
+                    if not bucket.acquire(cost):
+                        break
+                    requests += cost
+                    inflight[node.stem] = executor.submit(node.poll)
+                for stem, future in list(inflight.items()):
+                    if future.done():
+                        del inflight[stem]
+                render(watches, bucket, requests)
+                time.sleep(refresh)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for node in watches:
+            node.drop_session()